@@ -1,6 +1,6 @@
 import sys
 import json
-import time
+import asyncio
 import argparse
 
 import pandas as pd
@@ -11,6 +11,7 @@ from pathlib import Path
 from PySide6.QtWidgets import QApplication
 
 from src.gui import Gui
+from src.clients import aclose_http_clients
 from src.pipeline import Pipeline
 
 
@@ -23,16 +24,7 @@ def evaluate(command_line_args):
             raise ValueError("No project name specified. Please add a project name using -p or --project_name")
         
         if command_line_args.disable_gui:
-            metrics = []
-            for i in range(command_line_args.iterations):
-                pipeline = Pipeline(command_line_args, evaluate_index=i)
-                try:
-                    pipeline.start()
-                except Exception as e:
-                    print("Execution failed. Skipping this run. Error: ", e)
-
-                metrics.append(pipeline.metrics)
-                time.sleep(60)
+            metrics = asyncio.run(run_iterations(command_line_args))
 
             (ROOT / "evaluate").mkdir(parents=True, exist_ok=True)
             with open(ROOT / f"evaluate/{command_line_args.project}.json", "w+") as f:
@@ -44,6 +36,25 @@ def evaluate(command_line_args):
     visualize_metrics(ROOT / "evaluate")
 
 
+async def run_iterations(command_line_args):
+    """Runs all iterations on one event loop, so that the agents reuse the same HTTP connections"""
+    metrics = []
+    try:
+        for i in range(command_line_args.iterations):
+            pipeline = Pipeline(command_line_args, evaluate_index=i)
+            try:
+                await pipeline.astart()
+            except Exception as e:
+                print("Execution failed. Skipping this run. Error: ", e)
+
+            # No pause between iterations needed: agents wait for the shared rate limiters instead
+            metrics.append(pipeline.metrics)
+    finally:
+        await aclose_http_clients()
+
+    return metrics
+
+
 def _load_datasets(names):
     datasets = {}
     for name in names:
@@ -143,6 +154,42 @@ if __name__ == "__main__":
         required=False,
     )
 
+    parser.add_argument(
+        "-nc",
+        "--no_cache",
+        action="store_true",
+        help="Pass this flag to disable the on-disk cache for agent responses",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-fl",
+        "--fake_llm",
+        type=str,
+        nargs="?",
+        const="src/setup/fake_llm.json",
+        default=None,
+        help="Pass this flag to answer all LLM calls with the local fake server. Optionally takes the path to a script of responses",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-c",
+        "--candidates",
+        type=int,
+        default=1,
+        help="Set the number of developer candidates that are written and tested in parallel per turn",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-hr",
+        "--hot_reload",
+        action="store_true",
+        help="Pass this flag to keep the backend container running and only restart the script when the code changes",
+        required=False,
+    )
+
     parser.add_argument(
         "-s",
         "--skip_evaluation",
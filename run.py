@@ -45,4 +45,48 @@ if __name__ == "__main__":
         required=False,
     )
 
+    parser.add_argument(
+        "-st",
+        "--stream",
+        action="store_true",
+        help="Pass this flag to stream the answers of the agents token by token",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-nc",
+        "--no_cache",
+        action="store_true",
+        help="Pass this flag to disable the on-disk cache for agent responses",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-fl",
+        "--fake_llm",
+        type=str,
+        nargs="?",
+        const="src/setup/fake_llm.json",
+        default=None,
+        help="Pass this flag to answer all LLM calls with the local fake server. Optionally takes the path to a script of responses",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-c",
+        "--candidates",
+        type=int,
+        default=1,
+        help="Set the number of developer candidates that are written and tested in parallel per turn",
+        required=False,
+    )
+
+    parser.add_argument(
+        "-hr",
+        "--hot_reload",
+        action="store_true",
+        help="Pass this flag to keep the backend container running and only restart the script when the code changes",
+        required=False,
+    )
+
     run(parser.parse_args())
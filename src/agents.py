@@ -1,11 +1,18 @@
 import os
+import json
+import time
 import openai
+import asyncio
+import logging
 
 from pathlib import Path
+from functools import lru_cache
+from typing import Callable, Optional
 from dotenv import load_dotenv
 
-from langchain.chains import LLMChain
 from langchain_openai import ChatOpenAI
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema.runnable import Runnable
 from langchain.memory import ConversationBufferMemory, ConversationBufferWindowMemory
 from langchain.schema.messages import HumanMessage, AIMessage, SystemMessage
 
@@ -18,20 +25,125 @@ from langchain.prompts import (
 )
 
 from src.utils import *
+from src.cache import DiskCache
+from src.usage import UsageCallbackHandler, count_tokens, estimate_cost
+from src.clients import aclosing_streams, closing_streams, create_completion_clients
+from src.ratelimit import RateLimiter, get_rate_limiter, load_rate_limits
+from src.retry import (
+    RETRYABLE_ERRORS,
+    DEFAULT_RETRY_CONFIG,
+    LatencyTracker,
+    backoff_delay,
+    get_latency_tracker,
+    hedge_delay,
+)
 
 load_dotenv()
 openai.organization = os.getenv("OPENAI_ORG")
 openai.api_key = os.getenv("OPENAI_API_KEY")
 
+# Requests and tokens per minute of every model, relative to the root. All agents of a model share one limiter
+RATE_LIMITS_PATH = Path("src/setup/rate_limits.json")
+
+
+@lru_cache(maxsize=None)
+def read_cached_file(path: Path) -> str:
+    """Reads a character or prompt file only once per process"""
+    with open(path, "r") as f:
+        return f.read()
+
+
+@lru_cache(maxsize=None)
+def build_prompt_template(character: str) -> ChatPromptTemplate:
+    """Parses the prompt template of a character only once per process. Templates are immutable, so agents can share them"""
+    # Initialize prompt template
+    return ChatPromptTemplate(
+        messages=[
+            SystemMessagePromptTemplate.from_template(character),
+            MessagesPlaceholder(variable_name="chat_history"),
+            HumanMessagePromptTemplate.from_template("{message}"),
+        ]
+    )
+
+
+@lru_cache(maxsize=None)
+def load_agent_configs(path: Path) -> tuple:
+    """Reads agents.json only once per process"""
+    with open(path, "r") as file:
+        return tuple(json.load(file))
+
+
+class SnippetComplete(Exception):
+    """Raised by TokenCallbackHandler to end a stream once the code snippet of the parser is complete"""
+
+    def __init__(self, text: str) -> None:
+        super().__init__("The code snippet is complete")
+        self.text = text
+
+
+class _SnippetCompleteFilter(logging.Filter):
+    # Langchain logs every exception of a callback as warning, but ending a stream early is no error
+    def filter(self, record: logging.LogRecord) -> bool:
+        return "SnippetComplete" not in record.getMessage()
+
+
+logging.getLogger("langchain_core.callbacks.manager").addFilter(_SnippetCompleteFilter())
+
+
+class TokenCallbackHandler(BaseCallbackHandler):
+    """Passes every streamed token to a callback function"""
+
+    run_inline = True  # Call the handler in the thread of the event loop, not in an executor
+
+    def __init__(
+        self,
+        on_token: Optional[Callable[[str], None]],
+        scanner: Optional[SnippetScanner] = None,
+    ) -> None:
+        """
+        Args:
+            on_token (Optional[Callable[[str], None]]): Receives every token. None if only the scanner listens.
+            scanner (Optional[SnippetScanner]): If given, the stream is ended as soon as the scanner found a complete code snippet.
+        """
+        self.on_token = on_token or (lambda token: None)
+        self.scanner = scanner
+        self.raise_error = scanner is not None  # SnippetComplete has to abort the request
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if self.scanner is None:
+            self.on_token(token)
+            return
+
+        end = self.scanner.feed(token)
+        if end is None:
+            self.on_token(token)
+            return
+
+        # Pass on the rest of the snippet, but nothing after it
+        self.on_token(token[: len(token) - (len(self.scanner.text) - end)])
+        raise SnippetComplete(self.scanner.text[:end])
+
 
 class Agent:
     def __init__(
         self,
         config: dict,
         root: Path,
+        cache: Optional[DiskCache] = None,
+        on_call: Optional[Callable[[dict], None]] = None,
     ) -> None:
         self.root: Path = root
         self.config: dict = config
+        self.cache: Optional[DiskCache] = cache  # Responses are reused if a cache is given
+        self.on_call = on_call  # Receives a record (tokens, latency, cost) of every answer
+        self.retry_config: dict = {**DEFAULT_RETRY_CONFIG, **config.get("retry", {})}
+        self.base_url: Optional[str] = config.get("base_url")  # OpenAI compatible server instead of the OpenAI API
+
+        # Model cascade: the agent starts with "model" and can escalate to the stronger models listed in "cascade"
+        cascade = config.get("cascade") or {}
+        self.__models: list = [{"model": config["model"]}] + cascade.get("models", [])
+        self.__model_index: int = 0
+        self.escalate_after: Optional[int] = cascade.get("escalate_after")
 
         self.__name: str = config["name"]
         self.__varname: str = config["varname"]
@@ -40,10 +152,16 @@ class Agent:
         self.__templates: dict = self.__load_prompt_templates(config["prompts"])
         self.__languages: str = self.__load_agent_language()
 
-        self._chain: LLMChain = self.__setup_chain(
-            config["model"], config["temperature"]
+        # Create memory with window size of 2. This means that the last 2 messages will be returned (HumanMessage and AIMessage)
+        # The memory is managed outside of the chain, because the windowed history is part of the cache key
+        self._memory = ConversationBufferWindowMemory(
+            memory_key="chat_history", return_messages=True, k=2
         )
+        self._prompt: ChatPromptTemplate = self.__setup_prompt()
+        self.__activate_model(0)
         self.__parser: dict = config["parser"]
+        self.__message_parser: MessageParser = MessageParser(self.__parser)  # Compiled once per agent
+        self.__response_format: Optional[dict] = self.__setup_response_format()
 
     @property
     def name(self) -> str:
@@ -53,6 +171,10 @@ class Agent:
     def varname(self) -> str:
         return self.__varname
 
+    @property
+    def model(self) -> str:
+        return self.__models[self.__model_index]["model"]
+
     @property
     def languages(self) -> str:
         return self.__languages
@@ -61,6 +183,11 @@ class Agent:
     def parser(self):
         return self.__parser
 
+    @property
+    def memory_window(self) -> int:
+        """The number of exchanges (message and answer) that the agent remembers"""
+        return self._memory.k
+
     def __load_agent_language(self) -> str:
         if self.__varname == "orchestrator":
             return
@@ -74,51 +201,97 @@ class Agent:
             return "html/css/javascript"
 
     def __load_agent_character(self) -> str:
-        with open(self.root / f"src/characters/{self.__varname}.txt", "r") as f:
-            agent_character = f.read()
-
-        return agent_character
+        return read_cached_file(self.root / f"src/characters/{self.__varname}.txt")
 
     def __load_prompt_templates(self, prompt_paths: dict) -> dict:
         return {
-            key: open(self.root / prompt_path, "r").read()
+            key: read_cached_file(self.root / prompt_path)
             for key, prompt_path in prompt_paths.items()
         }
 
-    def __setup_chain(self, model: str, temperature: float) -> LLMChain:
-        if self.config["model"] == "gpt-4-vision-preview":
+    def __activate_model(self, index: int) -> None:
+        self.__model_index = index
+        model_config = self.__models[index]
+
+        self.rate_limiter: Optional[RateLimiter] = get_rate_limiter(
+            model_config["model"],
+            load_rate_limits(self.root / RATE_LIMITS_PATH).get(model_config["model"]),
+        )  # Shared by all agents using the same model
+        self.latency_tracker: LatencyTracker = get_latency_tracker(model_config["model"])
+
+        self._llm: ChatOpenAI = self.__setup_llm(
+            model_config["model"], self.config["temperature"]
+        )
+        self._chain: Runnable = self._prompt | self._llm
+
+    def escalate(self) -> Optional[tuple]:
+        """
+        Switches to the next model of the cascade. The chat history is kept.
+
+        Returns:
+            Optional[tuple]: The previous and the new model or None if the agent already uses its strongest model.
+        """
+        if self.__model_index + 1 >= len(self.__models):
+            return None
+
+        previous_model = self.model
+        self.__activate_model(self.__model_index + 1)
+        logging.info(f"{self.__name} escalates from {previous_model} to {self.model}")
+
+        return previous_model, self.model
+
+    def __setup_llm(self, model: str, temperature: float) -> ChatOpenAI:
+        # All agents send their requests through the same keep-alive connection pools
+        client, async_client = create_completion_clients(
+            self.retry_config["timeout"], self.base_url
+        )
+        # ChatOpenAI insists on an API key, even though the requests are sent by the clients above
+        api_key = (os.getenv("OPENAI_API_KEY") or "offline") if self.base_url else None
+
+        if model == "gpt-4-vision-preview":
             # We faced some issues with the vision model, so we had to limit the max tokens
             llm = ChatOpenAI(
                 model_name=model,
                 temperature=temperature,
-                max_tokens=500, 
+                max_tokens=500,
+                openai_api_key=api_key,
+                client=client,
+                async_client=async_client,
             )
         else:
             llm = ChatOpenAI(
                 model_name=model,
                 temperature=temperature,
+                openai_api_key=api_key,
+                client=client,
+                async_client=async_client,
             )
 
-        # Initialize prompt template
-        prompt = ChatPromptTemplate(
-            messages=[
-                SystemMessagePromptTemplate.from_template(self.__character),
-                MessagesPlaceholder(variable_name="chat_history"),
-                HumanMessagePromptTemplate.from_template("{message}"),
-            ]
-        )
-
-        # memory = ConversationBufferMemory(
-        #     memory_key="chat_history", return_messages=True
-        # )
-
-        # Create memory with window size of 2. This means that the last 2 messages will be returned (HumanMessage and AIMessage)
-        memory = ConversationBufferWindowMemory(
-            memory_key="chat_history", return_messages=True, k=2
-        )
+        return llm
 
+    def __setup_prompt(self) -> ChatPromptTemplate:
+        return build_prompt_template(self.__character)
 
-        return LLMChain(llm=llm, prompt=prompt, verbose=False, memory=memory)
+    def __chain_for(
+        self,
+        on_token: Optional[Callable[[str], None]],
+        usage: UsageCallbackHandler,
+        llm_kwargs: dict,
+        parser: Optional[MessageParser],
+    ) -> tuple:
+        """
+        Returns the chain and the run config. Streaming is requested if someone listens to the tokens or if the answer
+        is parsed, so that the stream can end with the first complete snippet the parser is looking for. A stop
+        sequence can not do that, because it would also match the closing fence of any snippet before it.
+        """
+        callbacks = [usage]
+        scanner = parser.scanner() if parser is not None else None
+        if on_token is not None or scanner is not None:
+            llm_kwargs = {**llm_kwargs, "stream": True}
+            callbacks.append(TokenCallbackHandler(on_token, scanner))
+
+        chain = (self._prompt | self._llm.bind(**llm_kwargs)) if llm_kwargs else self._chain
+        return chain, {"callbacks": callbacks}
 
     def get_prompt_text(self, key: str) -> str:
         return self.__templates[key]
@@ -136,31 +309,472 @@ class Agent:
             )
 
         # Add message to memory
-        self._chain.memory.chat_memory.add_message(message)
+        self._memory.chat_memory.add_message(message)
 
-    def answer(self, message: str, use_vision=False):
-        # Take screenshot etc if we're using vision
-        if use_vision:
-            image_path = take_screenshot()
-            image_base64 = encode_image(image_path)
-
-            message = HumanMessage(
-                content=[
-                    {"type": "text", "text": message},
-                    {
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_base64}"
-                            # "detail": "auto",
-                        },
+    def __cache_key(
+        self,
+        message: str,
+        chat_history: list,
+        llm_kwargs: dict,
+        parser: Optional[MessageParser],
+    ) -> str:
+        # The kwargs bound to the call (temperature, response format) and the snippet that ends the answer change the
+        # answer as well
+        return DiskCache.make_key(
+            self.model,
+            self.base_url,
+            self.config["temperature"],
+            self.__varname,
+            self.__character,
+            [(m.type, m.content) for m in chat_history],
+            message,
+            llm_kwargs,
+            parser.opening_fence if parser is not None else None,
+        )
+
+    def __vision_message(self, message: str, image_path: str) -> HumanMessage:
+        image_base64 = encode_image(image_path)
+
+        return HumanMessage(
+            content=[
+                {"type": "text", "text": message},
+                {
+                    "type": "image_url",
+                    "image_url": {
+                        "url": f"data:image/jpeg;base64,{image_base64}"
+                        # "detail": "auto",
                     },
-                ]
+                },
+            ]
+        )
+
+    def __lookup(
+        self,
+        message,
+        use_vision: bool,
+        llm_kwargs: dict,
+        parser: Optional[MessageParser],
+    ) -> tuple:
+        """Returns the chat history, the cache key and the cached answer (if any) for a message"""
+        chat_history = self._memory.load_memory_variables({})["chat_history"]
+
+        # Screenshots differ between runs, so vision requests are never cached
+        if self.cache is None or use_vision:
+            return chat_history, None, None
+
+        cache_key = self.__cache_key(message, chat_history, llm_kwargs, parser)
+        return chat_history, cache_key, self.cache.get(cache_key)
+
+    def __store(
+        self, message, answer: str, cache_key: Optional[str], remember: bool
+    ) -> None:
+        if cache_key is not None:
+            self.cache.set(cache_key, answer)
+
+        if remember:
+            self.remember(message, answer)
+
+    def remember(self, message, answer: str) -> None:
+        """Adds a message and its answer to the memory. Used for answers that were requested with remember=False"""
+        self._memory.save_context({"message": message}, {"text": answer})
+
+    def __estimate_prompt_tokens(self, inputs: dict) -> int:
+        prompt_messages = self._prompt.format_messages(**inputs)
+        prompt_text = "\n".join(str(m.content) for m in prompt_messages)
+        return count_tokens(prompt_text, self.model)
+
+    def __estimate_tokens(self, inputs: dict) -> tuple:
+        """Returns the estimated prompt tokens and the estimated total tokens that are reserved at the rate limiter"""
+        prompt_tokens = self.__estimate_prompt_tokens(inputs)
+        expected_completion_tokens = getattr(self._llm, "max_tokens", None) or 1000
+        return prompt_tokens, prompt_tokens + expected_completion_tokens
+
+    def __usage(
+        self,
+        inputs: dict,
+        answer: str,
+        usage: UsageCallbackHandler,
+        estimated_prompt_tokens: Optional[int],
+        reserved_tokens: Optional[int],
+    ) -> dict:
+        """Returns the token usage of a call and corrects the rate limiter. Estimates are used if the API did not report the usage"""
+        prompt_tokens, completion_tokens = usage.prompt_tokens, usage.completion_tokens
+        if prompt_tokens is None:
+            prompt_tokens = (
+                estimated_prompt_tokens
+                if estimated_prompt_tokens is not None
+                else self.__estimate_prompt_tokens(inputs)
             )
+        if completion_tokens is None:
+            completion_tokens = count_tokens(answer, self.model)
 
-        answer = self._chain.invoke({"message": message})["text"]
+        if self.rate_limiter is not None:
+            self.rate_limiter.settle(reserved_tokens, prompt_tokens + completion_tokens)
+
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+        }
+
+    def __attempt(
+        self,
+        inputs: dict,
+        on_token: Optional[Callable[[str], None]],
+        llm_kwargs: dict,
+        reserved_tokens: Optional[int],
+        parser: Optional[MessageParser],
+    ) -> tuple:
+        """Sends a single request. Returns the answer and the usage handler"""
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire(reserved_tokens)
+
+        start_time = time.perf_counter()
+        usage = UsageCallbackHandler()
+        chain, config = self.__chain_for(on_token, usage, llm_kwargs, parser)
+        try:
+            with closing_streams():
+                answer = chain.invoke(inputs, config).content
+        except SnippetComplete as e:
+            answer = e.text
+        except Exception:
+            if self.rate_limiter is not None:
+                self.rate_limiter.settle(reserved_tokens, 0)
+            raise
+
+        self.latency_tracker.add(time.perf_counter() - start_time)
+        return answer, usage
+
+    async def __aattempt(
+        self,
+        inputs: dict,
+        on_token: Optional[Callable[[str], None]],
+        llm_kwargs: dict,
+        reserved_tokens: Optional[int],
+        parser: Optional[MessageParser],
+    ) -> tuple:
+        """Same as __attempt, but awaits the rate limiter and the LLM. The attempt is cancelled after the timeout"""
+        if self.rate_limiter is not None:
+            await self.rate_limiter.aacquire(reserved_tokens)
+
+        start_time = time.perf_counter()
+        usage = UsageCallbackHandler()
+        chain, config = self.__chain_for(on_token, usage, llm_kwargs, parser)
+        try:
+            async with aclosing_streams():
+                answer = (
+                    await asyncio.wait_for(
+                        chain.ainvoke(inputs, config), self.retry_config["timeout"]
+                    )
+                ).content
+        except SnippetComplete as e:
+            answer = e.text
+        except BaseException:  # Also give back the reservation if the attempt was cancelled
+            if self.rate_limiter is not None:
+                self.rate_limiter.settle(reserved_tokens, 0)
+            raise
+
+        self.latency_tracker.add(time.perf_counter() - start_time)
+        return answer, usage
+
+    async def __ahedged_attempt(self, attempt: Callable, hedge_after: float) -> tuple:
+        """
+        Sends a duplicate request if the first one takes longer than hedge_after and returns whichever finishes first.
+        The other request is cancelled, also if the call itself is cancelled, so it does not keep its rate limit
+        reservation or distort the latency tracker.
+        """
+        tasks = [asyncio.ensure_future(attempt())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if done:
+                return tasks[0].result(), False
+
+            logging.info(f"{self.__name} sends a hedged request after {hedge_after:.1f}s")
+            tasks.append(asyncio.ensure_future(attempt()))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result(), True
+            return tasks[0].result(), True  # Both failed. Raises the error of the first request
+
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def __hedge_after(self, on_token: Optional[Callable[[str], None]]) -> Optional[float]:
+        # Two streams would garble the streamed tokens, so streamed answers are never hedged. Only the asyncio path
+        # hedges, because a thread that lost the race could not be cancelled
+        if on_token is not None:
+            return None
+        return hedge_delay(self.retry_config["hedge_after"], self.latency_tracker)
+
+    def __invoke(
+        self,
+        inputs: dict,
+        on_token: Optional[Callable[[str], None]],
+        llm_kwargs: dict,
+        parser: Optional[MessageParser] = None,
+    ) -> tuple:
+        """Calls the LLM with retries and backoff. Returns the answer and the token usage"""
+        estimated_prompt_tokens, reserved_tokens = None, None
+        if self.rate_limiter is not None:
+            estimated_prompt_tokens, reserved_tokens = self.__estimate_tokens(inputs)
+
+        attempt = lambda: self.__attempt(
+            inputs, on_token, llm_kwargs, reserved_tokens, parser
+        )
+        for retry in range(self.retry_config["max_retries"] + 1):
+            try:
+                (answer, usage), hedged = attempt(), False
+                break
+            except RETRYABLE_ERRORS as e:
+                if retry == self.retry_config["max_retries"]:
+                    raise
+                delay = backoff_delay(
+                    retry, self.retry_config["base_delay"], self.retry_config["max_delay"]
+                )
+                logging.warning(f"{self.__name} failed ({e}). Retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        usage = self.__usage(
+            inputs, answer, usage, estimated_prompt_tokens, reserved_tokens
+        )
+        return answer, {**usage, "retries": retry, "hedged": hedged}
+
+    async def __ainvoke(
+        self,
+        inputs: dict,
+        on_token: Optional[Callable[[str], None]],
+        llm_kwargs: dict,
+        parser: Optional[MessageParser] = None,
+    ) -> tuple:
+        """Same as __invoke, but awaits the rate limiter, the LLM and the backoff. Slow requests are hedged"""
+        estimated_prompt_tokens, reserved_tokens = None, None
+        if self.rate_limiter is not None:
+            estimated_prompt_tokens, reserved_tokens = self.__estimate_tokens(inputs)
+
+        attempt = lambda: self.__aattempt(
+            inputs, on_token, llm_kwargs, reserved_tokens, parser
+        )
+        for retry in range(self.retry_config["max_retries"] + 1):
+            try:
+                hedge_after = self.__hedge_after(on_token)
+                if hedge_after is None:
+                    (answer, usage), hedged = await attempt(), False
+                else:
+                    (answer, usage), hedged = await self.__ahedged_attempt(
+                        attempt, hedge_after
+                    )
+                break
+            except RETRYABLE_ERRORS as e:
+                if retry == self.retry_config["max_retries"]:
+                    raise
+                delay = backoff_delay(
+                    retry, self.retry_config["base_delay"], self.retry_config["max_delay"]
+                )
+                logging.warning(f"{self.__name} failed ({e}). Retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+        usage = self.__usage(
+            inputs, answer, usage, estimated_prompt_tokens, reserved_tokens
+        )
+        return answer, {**usage, "retries": retry, "hedged": hedged}
+
+    def __setup_response_format(self) -> Optional[dict]:
+        """Returns the structured-output mode of agents whose json parser has "json_mode" set"""
+        parser = self.__parser
+        if not parser or parser["type"] != "json" or not parser.get("json_mode"):
+            return None
+
+        if parser["json_mode"] == "schema":
+            # Strict structured outputs, only supported by newer models
+            schema = {**json_schema(parser["fields"]), "additionalProperties": False}
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": self.__varname, "schema": schema, "strict": True},
+            }
+        return {"type": "json_object"}
+
+    def __parse_kwargs(self, llm_kwargs: dict, parsed: bool) -> dict:
+        """Adds the response format of parsed answers to the kwargs bound to the LLM"""
+        if not parsed or self.__response_format is None:
+            return llm_kwargs
+
+        return {**llm_kwargs, "response_format": self.__response_format}
+
+    def __scan_parser(
+        self, parser: Optional[MessageParser], parsed: bool
+    ) -> Optional[MessageParser]:
+        """Returns the parser whose snippet ends a parsed answer or None if the answer is not parsed"""
+        parser = parser or self.__message_parser
+        return parser if parsed and parser.enabled else None
+
+    def __record(self, usage: Optional[dict], latency: float) -> None:
+        """Passes a record of the call to on_call. A missing usage means that the answer came from the cache"""
+        if self.on_call is None:
+            return
+
+        model = self.model
+        cached = usage is None
+        if cached:
+            usage = {
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "retries": 0,
+                "hedged": False,
+            }
+
+        self.on_call(
+            {
+                "agent": self.__varname,
+                "model": model,
+                **usage,
+                "latency": round(latency, 3),
+                "cached": cached,
+                "cost": estimate_cost(
+                    model, usage["prompt_tokens"], usage["completion_tokens"]
+                ),
+            }
+        )
+
+    def answer(
+        self,
+        message: str,
+        use_vision=False,
+        on_token: Optional[Callable[[str], None]] = None,
+        temperature: Optional[float] = None,
+        remember: bool = True,
+        parsed: bool = True,
+        parser: Optional[MessageParser] = None,
+    ):
+        """
+        Answers a message. If on_token is given, the answer is streamed and every token is passed to it.
+        Cached answers are passed to on_token as a whole.
+
+        The temperature of the agent can be overridden for a single call. With remember=False, neither the message nor
+        the answer are added to the memory, e.g. for candidates of which only one is kept (see Agent.remember).
+        With parsed, the answers of agents with a parser end after the first complete code snippet and json parsers
+        with "json_mode" use the structured-output mode of the model. Pass False for free text answers. If the answer
+        will be parsed with another parser than the one of the agent (e.g. a diff), pass it as parser, so that the
+        answer ends after its snippet instead.
+        """
+        # Take screenshot etc if we're using vision
+        if use_vision:
+            message = self.__vision_message(message, take_screenshot())
+
+        llm_kwargs = self.__parse_kwargs(
+            {} if temperature is None else {"temperature": temperature}, parsed
+        )
+        parser = self.__scan_parser(parser, parsed)
+
+        start_time = time.perf_counter()
+        chat_history, cache_key, answer = self.__lookup(
+            message, use_vision, llm_kwargs, parser
+        )
+        usage = None
+        if answer is None:
+            inputs = {"message": message, "chat_history": chat_history}
+            answer, usage = self.__invoke(inputs, on_token, llm_kwargs, parser)
+        elif on_token is not None:
+            on_token(answer)
+
+        self.__store(message, answer, cache_key, remember)
+        self.__record(usage, time.perf_counter() - start_time)
+
+        return answer
+
+    async def aanswer(
+        self,
+        message: str,
+        use_vision=False,
+        on_token: Optional[Callable[[str], None]] = None,
+        temperature: Optional[float] = None,
+        remember: bool = True,
+        parsed: bool = True,
+        parser: Optional[MessageParser] = None,
+    ):
+        """Same as answer, but awaits the LLM (and the screenshot) without blocking the event loop"""
+        if use_vision:
+            image_path = await asyncio.to_thread(take_screenshot)
+            message = self.__vision_message(message, image_path)
+
+        llm_kwargs = self.__parse_kwargs(
+            {} if temperature is None else {"temperature": temperature}, parsed
+        )
+        parser = self.__scan_parser(parser, parsed)
+
+        start_time = time.perf_counter()
+        chat_history, cache_key, answer = self.__lookup(
+            message, use_vision, llm_kwargs, parser
+        )
+        usage = None
+        if answer is None:
+            inputs = {"message": message, "chat_history": chat_history}
+            answer, usage = await self.__ainvoke(inputs, on_token, llm_kwargs, parser)
+        elif on_token is not None:
+            on_token(answer)
+
+        self.__store(message, answer, cache_key, remember)
+        self.__record(usage, time.perf_counter() - start_time)
 
         return answer
 
+    def __correction_prompt(
+        self, answer: str, error: ParseError, parser: MessageParser
+    ) -> Optional[str]:
+        """Returns the prompt that asks for a corrected JSON object or None if the answer can not be corrected"""
+        if parser.type != "json" or "correct" not in self.__templates:
+            return None
+
+        logging.warning(f"{self.__name} sent malformed JSON ({error}). Asking for a correction")
+        return self.__templates["correct"].format(
+            error=error,
+            answer=answer,
+            schema=json.dumps(json_schema(parser.config["fields"])),
+        )
+
+    def parse(self, answer: str, parser: Optional[MessageParser] = None):
+        """
+        Parses an answer of the agent. JSON is repaired locally first. Only if that fails, the model is asked once to
+        correct its answer (if the agent has a "correct" prompt).
+
+        Args:
+            answer (str): The answer of the agent.
+            parser (Optional[MessageParser]): Overrides the parser of the agent.
+
+        Returns:
+            The parsed answer. Raises ParseError if even the corrected answer can not be parsed.
+        """
+        parser = parser or self.__message_parser
+        try:
+            return parser.parse(answer)
+        except ParseError as e:
+            correction_prompt = self.__correction_prompt(answer, e, parser)
+            if correction_prompt is None:
+                raise
+
+        return parser.parse(
+            self.answer(correction_prompt, remember=False, parser=parser)
+        )
+
+    async def aparse(self, answer: str, parser: Optional[MessageParser] = None):
+        """Same as parse, but awaits the correction"""
+        parser = parser or self.__message_parser
+        try:
+            return parser.parse(answer)
+        except ParseError as e:
+            correction_prompt = self.__correction_prompt(answer, e, parser)
+            if correction_prompt is None:
+                raise
+
+        return parser.parse(
+            await self.aanswer(correction_prompt, remember=False, parser=parser)
+        )
+
 
 class HumanConversationWrapper:
     def __init__(
@@ -182,10 +796,10 @@ class HumanConversationWrapper:
         self.agent1.inject_message(system_message, kind="system")
         self.prompt_template = PromptTemplate.from_template(conversation_task)
 
-    def __iter__(self):
+    def __aiter__(self):
         return self
 
-    def __next__(self):
+    async def __anext__(self):
         if self.__accepted == False and self.current_turn == 0:
             self.current_turn += 1
             return (
@@ -197,8 +811,8 @@ class HumanConversationWrapper:
             # Insert user response into prompt template
             prompt = self.prompt_template.format(user_response=self.__user_response)
 
-            ai_response_txt = self.agent1.answer(prompt)
-            ai_response = parse_message(ai_response_txt, self.agent1.parser)
+            ai_response_txt = await self.agent1.aanswer(prompt)
+            ai_response = await self.agent1.aparse(ai_response_txt)
             self.__accepted, message = ai_response["accepted"], ai_response["text"]
             self.current_turn += 1
 
@@ -211,7 +825,7 @@ class HumanConversationWrapper:
             return (self.agent1.name, message)
 
         else:
-            raise StopIteration
+            raise StopAsyncIteration
 
     def set_user_response(self, user_response: str) -> None:
         self.__user_response = user_response
@@ -0,0 +1,131 @@
+import re
+import json
+import math
+import difflib
+
+from pathlib import Path
+from functools import lru_cache
+from typing import List, Optional
+
+
+DEFAULT_TURN_BUDGET = {
+    "max_turns": 7,  # Hard limit, also used if there is no history yet
+    "min_turns": 2,  # The learned budget never goes below this
+    "quantile": 0.9,  # Quantile of the historical turns that the budget covers
+    "slack": 1,  # Extra turns on top of the quantile
+    "patience": 2,  # Consecutive turns without progress before the loop is aborted
+    "similarity": 0.95,  # Code or complaints at least this similar count as no progress
+}
+
+
+@lru_cache(maxsize=None)
+def _historical_turns(metrics_dir: Path, layer: str, max_turns: int) -> tuple:
+    """Reads the turns of a layer from all evaluation runs only once per process"""
+    turns = []
+    for path in sorted(Path(metrics_dir).glob("*.json")):
+        try:
+            with open(path, "r") as file:
+                runs = json.load(file)
+        except (OSError, json.JSONDecodeError):
+            continue
+
+        # evaluate.py writes the metrics of a single run, the collected results are lists of runs
+        for run in runs if isinstance(runs, list) else [runs]:
+            layer_turns = run.get(f"turns_{layer}") if isinstance(run, dict) else None
+            # Runs that crashed (0 turns) say nothing about the turns a layer needs. Runs that hit the limit needed
+            # at least the limit, so they are counted with it instead of being dropped (censored data)
+            if isinstance(layer_turns, int) and layer_turns > 0:
+                turns.append(min(layer_turns, max_turns))
+
+    return tuple(sorted(turns))
+
+
+def learn_turn_budget(metrics_dir: Path, layer: str, config: Optional[dict] = None) -> int:
+    """
+    Derives the turn budget of a layer from the metrics of previous evaluation runs (evaluate/*.json).
+
+    Args:
+        metrics_dir (Path): The folder with the evaluation metrics.
+        layer (str): The layer ("database", "backend" or "frontend").
+        config (Optional[dict]): The "turn_budget" entry of the developer in agents.json.
+
+    Returns:
+        int: The quantile of the historical turns plus slack, clamped to [min_turns, max_turns].
+    """
+    config = {**DEFAULT_TURN_BUDGET, **(config or {})}
+    turns = _historical_turns(Path(metrics_dir), layer, config["max_turns"])
+    if not turns:
+        return config["max_turns"]
+
+    quantile_turns = turns[min(len(turns) - 1, math.ceil(config["quantile"] * len(turns)) - 1)]
+    return max(
+        config["min_turns"], min(config["max_turns"], quantile_turns + config["slack"])
+    )
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class ProgressTracker:
+    """Detects a dev/test loop that is stuck, i.e. the code or the complaints of the tester stop changing"""
+
+    def __init__(self, patience: int, similarity: float) -> None:
+        """
+        Args:
+            patience (int): Consecutive turns without progress after which the loop is stuck.
+            similarity (float): Similarity ratio from which two codes or complaints count as the same.
+        """
+        self.patience = patience
+        self.similarity = similarity
+        self.__codes: List[str] = []
+        self.__complaints: List[str] = []
+        self.__unchanged_code = 0
+        self.__repeated_complaint = 0
+
+    def __similar(self, a: str, b: str) -> bool:
+        if a == b:
+            return True
+        matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+        # The quick upper bounds avoid the full comparison for texts that clearly differ
+        return (
+            matcher.real_quick_ratio() >= self.similarity
+            and matcher.quick_ratio() >= self.similarity
+            and matcher.ratio() >= self.similarity
+        )
+
+    def update(self, code: str, complaint: str) -> Optional[str]:
+        """
+        Records a rejected turn.
+
+        Args:
+            code (str): The code of the developer.
+            complaint (str): The feedback of the tester.
+
+        Returns:
+            Optional[str]: "no_change" or "same_complaint" if the loop is stuck, otherwise None.
+        """
+        code, complaint = _normalize(code), _normalize(complaint)
+
+        if self.__codes and self.__similar(self.__codes[-1], code):
+            self.__unchanged_code += 1
+        else:
+            self.__unchanged_code = 0
+        if self.__complaints and self.__similar(self.__complaints[-1], complaint):
+            self.__repeated_complaint += 1
+        else:
+            self.__repeated_complaint = 0
+
+        self.__codes.append(code)
+        self.__complaints.append(complaint)
+
+        if self.__unchanged_code >= self.patience:
+            return "no_change"
+        if self.__repeated_complaint >= self.patience:
+            return "same_complaint"
+        return None
+
+    def reset(self) -> None:
+        """Forgets the counters, e.g. after the developer was escalated to a stronger model"""
+        self.__unchanged_code = 0
+        self.__repeated_complaint = 0
@@ -0,0 +1,117 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+
+class DiskCache:
+    """
+    A persistent key-value store backed by SQLite with least-recently-used eviction.
+
+    Values have to be JSON serializable. Every operation opens its own connection, so a single
+    instance can be shared between the GUI thread and the pipeline thread.
+    """
+
+    def __init__(self, path: Path, max_entries: int = 5000) -> None:
+        """
+        Initializes the cache. The database file is created on first use if it does not exist yet.
+
+        Args:
+            path (Path): The path to the SQLite database file.
+            max_entries (int): The maximum number of entries before the least recently used ones are evicted.
+        """
+        self.path = Path(path)
+        self.max_entries = max_entries
+
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__initialized = False  # The database is created on first use, so that creating a cache is free
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """
+        Creates a stable key from arbitrary JSON serializable parts.
+
+        Returns:
+            str: The SHA-256 hex digest of the serialized parts.
+        """
+        serialized = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def __connect(self) -> Iterator[sqlite3.Connection]:
+        if not self.__initialized:
+            self.path.parent.mkdir(exist_ok=True, parents=True)
+
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:  # Commits on success, rolls back on error
+                if not self.__initialized:
+                    connection.execute(
+                        "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value TEXT NOT NULL, accessed REAL NOT NULL)"
+                    )
+                    connection.execute(
+                        "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+                    )
+                    self.__initialized = True
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        Returns the cached value for the key and marks it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[Any]: The cached value or None on a miss.
+        """
+        with self.__lock, self.__connect() as connection:
+            row = connection.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.__misses += 1
+                return None
+
+            connection.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+            self.__hits += 1
+
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        """
+        Stores a value and evicts the least recently used entries if the cache is full.
+
+        Args:
+            key (str): The cache key.
+            value (Any): The JSON serializable value.
+        """
+        with self.__lock, self.__connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, accessed) VALUES (?, ?, ?)",
+                (key, json.dumps(value), time.time()),
+            )
+            connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
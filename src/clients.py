@@ -0,0 +1,200 @@
+import os
+import asyncio
+import threading
+import weakref
+import contextvars
+
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Iterator, Optional
+
+import httpx
+import openai
+
+
+# Maximum number of connections kept by the shared HTTP clients. Can be set in the .env file
+POOL_SIZE = int(os.getenv("AGENTCY_HTTP_POOL_SIZE", 20))
+
+_http_client: Optional[httpx.Client] = None
+_async_http_clients = weakref.WeakKeyDictionary()  # One client per event loop
+_lock = threading.Lock()
+
+# Streams opened within closing_streams. Unlike the event loop, a context variable also follows the request into
+# the callbacks of langchain
+_open_streams: contextvars.ContextVar = contextvars.ContextVar(
+    "open_streams", default=None
+)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=POOL_SIZE,
+        max_keepalive_connections=POOL_SIZE,
+        keepalive_expiry=60,
+    )
+
+
+def get_http_client() -> httpx.Client:
+    """
+    Returns the keep-alive HTTP client that is shared by all agents (and pipelines) of the process.
+
+    Returns:
+        httpx.Client: The shared synchronous client.
+    """
+    global _http_client
+
+    with _lock:
+        if _http_client is None:
+            _http_client = httpx.Client(limits=_limits(), timeout=None)
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """
+    Returns the keep-alive HTTP client of the running event loop. Async connections can not be shared between event
+    loops, so every loop gets its own client that is reused by all agents running on it.
+
+    Returns:
+        httpx.AsyncClient: The shared asynchronous client.
+    """
+    loop = asyncio.get_running_loop()
+
+    with _lock:
+        if loop not in _async_http_clients:
+            _async_http_clients[loop] = httpx.AsyncClient(
+                limits=_limits(), timeout=None
+            )
+        return _async_http_clients[loop]
+
+
+async def aclose_http_clients() -> None:
+    """
+    Closes the client of the running event loop and the shared synchronous client, so that their pooled connections
+    do not outlive the run. Both are created again on next use.
+    """
+    global _http_client
+
+    loop = asyncio.get_running_loop()
+    with _lock:
+        async_http_client = _async_http_clients.pop(loop, None)
+        http_client, _http_client = _http_client, None
+
+    if async_http_client is not None:
+        await async_http_client.aclose()
+    if http_client is not None:
+        http_client.close()
+
+
+def _client_params(timeout: float, base_url: Optional[str]) -> dict:
+    params = {
+        "organization": os.getenv("OPENAI_ORG"),
+        "timeout": timeout,
+        "max_retries": 0,  # Retries are handled by the agent
+    }
+    if base_url is not None:
+        # An OpenAI compatible server, e.g. src/fakeserver.py. It might not need a real API key
+        params["base_url"] = base_url
+        params["api_key"] = os.getenv("OPENAI_API_KEY") or "offline"
+    return params
+
+
+def _track(stream):
+    streams = _open_streams.get()
+    if streams is not None and isinstance(
+        stream, (openai.Stream, openai.AsyncStream)
+    ):
+        streams.append(stream)
+    return stream
+
+
+@contextmanager
+def closing_streams() -> Iterator[None]:
+    """
+    Closes the streamed responses that were opened within the block. An aborted stream would otherwise hold its
+    pooled connection until the garbage collector finds it.
+    """
+    streams = []
+    token = _open_streams.set(streams)
+    try:
+        yield
+    finally:
+        _open_streams.reset(token)
+        for stream in streams:
+            stream.close()  # Does nothing if the stream was read to the end
+
+
+@asynccontextmanager
+async def aclosing_streams() -> AsyncIterator[None]:
+    """Same as closing_streams, but for streams of the asynchronous client"""
+    streams = []
+    token = _open_streams.set(streams)
+    try:
+        yield
+    finally:
+        _open_streams.reset(token)
+        for stream in streams:
+            await stream.close()
+
+
+class Completions:
+    """
+    Drop-in replacement for openai.OpenAI().chat.completions that sends every request through the shared client.
+    Streams opened within closing_streams are registered.
+    """
+
+    def __init__(self, timeout: float, base_url: Optional[str] = None) -> None:
+        self.timeout = timeout
+        self.base_url = base_url
+        self.__http_client = None
+        self.__completions = None
+
+    def create(self, **kwargs):
+        http_client = get_http_client()
+        if http_client is not self.__http_client:
+            # First request or the shared client was closed and created again
+            self.__http_client = http_client
+            self.__completions = openai.OpenAI(
+                http_client=http_client, **_client_params(self.timeout, self.base_url)
+            ).chat.completions
+
+        return _track(self.__completions.create(**kwargs))
+
+
+class AsyncCompletions:
+    """
+    Drop-in replacement for openai.AsyncOpenAI().chat.completions that sends every request through the shared client
+    of the running event loop. Streams opened within aclosing_streams are registered.
+    """
+
+    def __init__(self, timeout: float, base_url: Optional[str] = None) -> None:
+        self.timeout = timeout
+        self.base_url = base_url
+        self.__completions = weakref.WeakKeyDictionary()
+
+    async def create(self, **kwargs):
+        loop = asyncio.get_running_loop()
+        http_client = get_async_http_client()
+        if loop not in self.__completions or self.__completions[loop][0] is not http_client:
+            # First request on this loop or the client of the loop was closed and created again
+            self.__completions[loop] = (
+                http_client,
+                openai.AsyncOpenAI(
+                    http_client=http_client,
+                    **_client_params(self.timeout, self.base_url),
+                ).chat.completions,
+            )
+
+        return _track(await self.__completions[loop][1].create(**kwargs))
+
+
+def create_completion_clients(timeout: float, base_url: Optional[str] = None) -> tuple:
+    """
+    Creates the completion clients for a ChatOpenAI instance that use the shared connection pools.
+
+    Args:
+        timeout (float): The timeout of a single request in seconds.
+        base_url (Optional[str]): The URL of an OpenAI compatible server. Defaults to the OpenAI API.
+
+    Returns:
+        tuple: The synchronous and the asynchronous chat completions client.
+    """
+    return Completions(timeout, base_url), AsyncCompletions(timeout, base_url)
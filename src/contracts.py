@@ -0,0 +1,219 @@
+import re
+import json
+import asyncio
+
+from typing import Optional
+
+import httpx
+
+from src.clients import get_async_http_client
+
+
+# Start of a table definition. The body in parentheses is matched separately, because it can contain parentheses
+CREATE_TABLE_PATTERN = re.compile(
+    r"create\s+(?:(?:global\s+|local\s+)?(?:temporary|temp|unlogged)\s+)?table\s+(?:if\s+not\s+exists\s+)?"
+    r"((?:\"[^\"]+\"|[\w]+)(?:\.(?:\"[^\"]+\"|[\w]+))?)\s*\(",
+    re.IGNORECASE,
+)
+TABLE_CONSTRAINT_KEYWORDS = ("constraint", "primary", "foreign", "unique", "check", "exclude")
+
+
+def _dumps(contract) -> str:
+    return json.dumps(contract, separators=(",", ":"))
+
+
+def _strip_sql_comments(code: str) -> str:
+    code = re.sub(r"/\*.*?\*/", " ", code, flags=re.DOTALL)
+    return re.sub(r"--[^\n]*", "", code)
+
+
+def _split_top_level(body: str) -> list:
+    """Splits the body of a table definition at the commas outside of parentheses and quotes"""
+    parts, depth, quote, current = [], 0, None, ""
+    for char in body:
+        if quote is not None:
+            quote = None if char == quote else quote
+        elif char in ("'", '"'):
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        current += char
+    parts.append(current)
+    return [" ".join(part.split()) for part in parts if part.strip()]
+
+
+def database_contract(code: str) -> Optional[str]:
+    """
+    Extracts the tables of the SQL code as compact JSON, e.g. {"users":{"id":"SERIAL PRIMARY KEY","name":"TEXT"}}.
+
+    Args:
+        code (str): The SQL code of the database developer.
+
+    Returns:
+        Optional[str]: The tables with their columns and constraints or None if the code does not create a table.
+    """
+    code = _strip_sql_comments(code)
+    tables = {}
+    for match in CREATE_TABLE_PATTERN.finditer(code):
+        # Find the parenthesis that closes the table definition
+        depth, end = 1, match.end()
+        while end < len(code) and depth > 0:
+            depth += {"(": 1, ")": -1}.get(code[end], 0)
+            end += 1
+        if depth > 0:
+            continue
+
+        columns = {}
+        for definition in _split_top_level(code[match.end() : end - 1]):
+            if definition.lower().startswith(TABLE_CONSTRAINT_KEYWORDS):
+                columns.setdefault("constraints", []).append(definition)
+            else:
+                name, _, column_type = definition.partition(" ")
+                columns[name.strip('"')] = column_type
+        tables[match.group(1).replace('"', "")] = columns
+
+    return _dumps(tables) if tables else None
+
+
+def _schema_summary(schema: dict, components: dict, depth: int = 0):
+    """Reduces a JSON schema to the types of its fields. Optional fields are marked with a trailing '?'"""
+    if "$ref" in schema:
+        schema = components.get(schema["$ref"].split("/")[-1], {})
+    if depth > 3:
+        return "object"
+
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if combinator in schema:
+            options = [
+                _schema_summary(option, components, depth + 1)
+                for option in schema[combinator]
+                if option.get("type") != "null"
+            ]
+            return options[0] if len(options) == 1 else options
+
+    if schema.get("type") == "array":
+        return [_schema_summary(schema.get("items", {}), components, depth + 1)]
+    if "properties" in schema:
+        required = set(schema.get("required", []))
+        return {
+            name + ("" if name in required else "?"): _schema_summary(
+                field, components, depth + 1
+            )
+            for name, field in schema["properties"].items()
+        }
+    if "enum" in schema:
+        return "|".join(str(value) for value in schema["enum"])
+    return schema.get("type", "any")
+
+
+def compact_openapi(openapi: dict, base_url: Optional[str] = None) -> str:
+    """
+    Reduces an OpenAPI document to its endpoints with their parameters, request bodies and responses.
+
+    Args:
+        openapi (dict): The OpenAPI document of the backend.
+        base_url (Optional[str]): The URL the backend runs at. Defaults to the first "servers" entry of the document.
+
+    Returns:
+        str: Compact JSON, e.g. {"base_url":"http://localhost:8000","GET /users/{user_id}":{"params":{...},...}}.
+    """
+    components = openapi.get("components", {}).get("schemas", {})
+    endpoints = {}
+    # The frontend is served from another port, so it needs the address of the backend, not just the paths
+    base_url = base_url or next(
+        (server["url"] for server in openapi.get("servers", []) if "url" in server), None
+    )
+    if base_url is not None:
+        endpoints["base_url"] = base_url
+    for path, operations in openapi.get("paths", {}).items():
+        for method, operation in operations.items():
+            if not isinstance(operation, dict) or "responses" not in operation:
+                continue  # Path level entries like "parameters"
+
+            endpoint = {}
+            params = {
+                parameter["name"]
+                + ("" if parameter.get("required") else "?"): _schema_summary(
+                    parameter.get("schema", {}), components
+                )
+                for parameter in operation.get("parameters", [])
+            }
+            if params:
+                endpoint["params"] = params
+
+            body = operation.get("requestBody", {}).get("content", {})
+            if body:
+                media_type = next(iter(body.values()))
+                endpoint["body"] = _schema_summary(media_type.get("schema", {}), components)
+
+            for status, response in operation["responses"].items():
+                if status.startswith("2"):
+                    content = response.get("content", {})
+                    if content:
+                        endpoint["returns"] = _schema_summary(
+                            next(iter(content.values())).get("schema", {}), components
+                        )
+                    break
+
+            endpoints[f"{method.upper()} {path}"] = endpoint
+
+    return _dumps(endpoints)
+
+
+async def backend_contract(url: str, timeout: float = 10) -> Optional[str]:
+    """
+    Fetches the OpenAPI document from the running FastAPI backend and compacts it.
+
+    Args:
+        url (str): The URL of the backend container.
+        timeout (float): Seconds to wait for the backend to answer.
+
+    Returns:
+        Optional[str]: The compact endpoints or None if the backend does not serve an OpenAPI document.
+    """
+    client = get_async_http_client()
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        try:
+            response = await client.get(f"{url}/openapi.json", timeout=2)
+            response.raise_for_status()
+            return compact_openapi(response.json(), base_url=url)
+        except httpx.UnsupportedProtocol:
+            return None
+        except httpx.TransportError:
+            # The server might still be starting
+            if asyncio.get_running_loop().time() > deadline:
+                return None
+            await asyncio.sleep(0.5)
+        except (httpx.HTTPError, ValueError):
+            return None  # No FastAPI backend or no valid document
+
+
+def describe_contracts(contracts: dict, docs: dict) -> str:
+    """
+    Describes the finished layers for the prompts of the following layers. The prose documentation is only used if
+    there is no contract.
+
+    Args:
+        contracts (dict): The contract of every finished layer or None.
+        docs (dict): The documentation of every finished layer.
+
+    Returns:
+        str: One line per layer.
+    """
+    descriptions = {
+        "database": "Here are the tables of the database as JSON",
+        "backend": "Here are the API endpoints of the backend as JSON (send the requests to its base_url, a trailing '?' marks optional fields)",
+    }
+    return "".join(
+        f"{descriptions[layer]}: {contracts[layer]}\n"
+        if contracts.get(layer) is not None
+        else f"Here is the documentation for the {layer}: {doc}\n"
+        for layer, doc in docs.items()
+    )
@@ -0,0 +1,330 @@
+import re
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
+
+from pathlib import Path
+from typing import Iterator, Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.usage import count_tokens
+
+
+# Script that lets a fast-forwarded pipeline run through all layers without a real model
+DEFAULT_SCRIPT = Path(__file__).parent / "setup/fake_llm.json"
+
+
+def _message_text(content) -> str:
+    # Vision requests send a list of text and image parts
+    if isinstance(content, list):
+        return "".join(part.get("text", "") for part in content)
+    return content or ""
+
+
+def _messages_key(messages: list) -> str:
+    serialized = json.dumps(
+        [(m["role"], _message_text(m.get("content"))) for m in messages]
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class FakeLLMServer:
+    """
+    A local stand-in for the OpenAI chat completions API that answers with scripted or replayed responses.
+
+    The script is a JSON file with the following keys (all optional):
+        "latency": Seconds until the first token is sent.
+        "tokens_per_second": Generation speed. Unlimited if missing.
+        "replay": Recorded calls as {"messages": [...], "content": str}. A request with exactly the same
+            messages gets the recorded answer.
+        "rules": Scripted answers as {"model": regex, "system": regex, "message": regex, "responses": [str]}.
+            The first rule whose regexes are found in the model, the system message and the last user message is
+            used. Its responses are returned in order, the last one is repeated.
+        "default": The answer if no replay and no rule matches.
+    """
+
+    def __init__(
+        self,
+        script_path: Optional[Path] = None,
+        latency: Optional[float] = None,
+        tokens_per_second: Optional[float] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """
+        Initializes the server. It does not listen before start is called.
+
+        Args:
+            script_path (Optional[Path]): The path to the script. Defaults to src/setup/fake_llm.json.
+            latency (Optional[float]): Overrides the latency of the script.
+            tokens_per_second (Optional[float]): Overrides the token rate of the script.
+            host (str): The host to bind to.
+            port (int): The port to bind to. 0 picks a free port.
+        """
+        with open(script_path or DEFAULT_SCRIPT, "r") as file:
+            script = json.load(file)
+
+        self.latency: float = latency if latency is not None else script.get("latency", 0.0)
+        self.tokens_per_second: Optional[float] = (
+            tokens_per_second
+            if tokens_per_second is not None
+            else script.get("tokens_per_second")
+        )
+        self.default: str = script.get("default", "")
+
+        self.__replay = {
+            _messages_key(call["messages"]): call["content"]
+            for call in script.get("replay", [])
+        }
+        self.__rules = [
+            {
+                "patterns": {
+                    part: re.compile(rule[part], re.DOTALL | re.IGNORECASE)
+                    for part in ("model", "system", "message")
+                    if part in rule
+                },
+                "responses": rule["responses"],
+            }
+            for rule in script.get("rules", [])
+        ]
+        self.__cursors = [0] * len(self.__rules)  # Index of the next response of every rule
+        self.__lock = threading.Lock()
+
+        self.__server = ThreadingHTTPServer((host, port), self.__handler_class())
+        self.__server.daemon_threads = True
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        """The base URL that has to be passed to the OpenAI client"""
+        host, port = self.__server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> str:
+        """
+        Serves requests in a background thread.
+
+        Returns:
+            str: The base URL of the server.
+        """
+        if self.__thread is None:
+            self.__thread = threading.Thread(
+                target=self.serve_forever, name="fake-llm", daemon=True
+            )
+            self.__thread.start()
+        return self.url
+
+    def serve_forever(self) -> None:
+        """Serves requests in the calling thread until stop is called"""
+        self.__server.serve_forever()
+
+    def stop(self) -> None:
+        self.__server.shutdown()
+        self.__server.server_close()
+        self.__thread = None
+
+    def __enter__(self) -> "FakeLLMServer":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def respond(self, model: str, messages: list) -> str:
+        """
+        Picks the answer to a request.
+
+        Args:
+            model (str): The requested model.
+            messages (list): The messages of the request.
+
+        Returns:
+            str: The replayed or scripted answer.
+        """
+        replayed = self.__replay.get(_messages_key(messages))
+        if replayed is not None:
+            return replayed
+
+        texts = {
+            "model": model,
+            "system": "\n".join(
+                _message_text(m.get("content")) for m in messages if m["role"] == "system"
+            ),
+            "message": next(
+                (
+                    _message_text(m.get("content"))
+                    for m in reversed(messages)
+                    if m["role"] == "user"
+                ),
+                "",
+            ),
+        }
+        for i, rule in enumerate(self.__rules):
+            if all(
+                pattern.search(texts[part]) for part, pattern in rule["patterns"].items()
+            ):
+                with self.__lock:
+                    response = rule["responses"][
+                        min(self.__cursors[i], len(rule["responses"]) - 1)
+                    ]
+                    self.__cursors[i] += 1
+                return response
+
+        return self.default
+
+    def chunks(self, content: str) -> Iterator[str]:
+        """Splits an answer into word-sized pieces that are sent at the configured token rate"""
+        for chunk in re.findall(r"\s*\S+|\s+", content):
+            if self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            yield chunk
+
+    def __handler_class(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # Keep-alive, like the real API
+
+            def log_message(self, format, *args) -> None:
+                pass  # The pipeline logs are noisy enough
+
+            def do_GET(self) -> None:
+                if self.path.rstrip("/").endswith("/models"):
+                    self.__send_json({"object": "list", "data": []})
+                else:
+                    self.__send_json({"error": {"message": "Not found"}}, status=404)
+
+            def do_POST(self) -> None:
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.__send_json({"error": {"message": "Not found"}}, status=404)
+                    return
+
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                model = request.get("model", "")
+                messages = request.get("messages", [])
+
+                content = server.respond(model, messages)
+                stop = request.get("stop") or []
+                for sequence in [stop] if isinstance(stop, str) else stop:
+                    content = content.split(sequence)[0]
+
+                time.sleep(server.latency)
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                if request.get("stream"):
+                    try:
+                        self.__stream(completion_id, model, content)
+                    except (BrokenPipeError, ConnectionResetError):
+                        self.close_connection = True  # The client ended the stream early
+                else:
+                    pieces = "".join(server.chunks(content))  # Waits as long as a stream would take
+                    prompt = "".join(
+                        _message_text(m.get("content"))
+                        for m in messages
+                    )
+                    prompt_tokens = count_tokens(prompt, model)
+                    completion_tokens = count_tokens(pieces, model)
+                    self.__send_json(
+                        {
+                            "id": completion_id,
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": model,
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": {"role": "assistant", "content": pieces},
+                                    "finish_reason": "stop",
+                                }
+                            ],
+                            "usage": {
+                                "prompt_tokens": prompt_tokens,
+                                "completion_tokens": completion_tokens,
+                                "total_tokens": prompt_tokens + completion_tokens,
+                            },
+                        }
+                    )
+
+            def __send_json(self, body: dict, status: int = 200) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def __stream(self, completion_id: str, model: str, content: str) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def event(delta: dict, finish_reason: Optional[str] = None) -> None:
+                    chunk = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {"index": 0, "delta": delta, "finish_reason": finish_reason}
+                        ],
+                    }
+                    self.__write_chunk(f"data: {json.dumps(chunk)}\n\n")
+
+                event({"role": "assistant", "content": ""})
+                for piece in server.chunks(content):
+                    event({"content": piece})
+                event({}, finish_reason="stop")
+                self.__write_chunk("data: [DONE]\n\n")
+                self.__write_chunk("")  # Terminates the chunked body
+
+            def __write_chunk(self, data: str) -> None:
+                payload = data.encode("utf-8")
+                self.wfile.write(f"{len(payload):X}\r\n".encode("ascii") + payload + b"\r\n")
+                self.wfile.flush()
+
+        return Handler
+
+
+_server: Optional[FakeLLMServer] = None
+_server_lock = threading.Lock()
+
+
+def get_fake_server(script_path: Optional[Path] = None) -> FakeLLMServer:
+    """
+    Returns the fake server of the process and starts it on first use. All pipelines of an evaluation share it.
+
+    Args:
+        script_path (Optional[Path]): The script of the server. Only used when the server is started.
+
+    Returns:
+        FakeLLMServer: The running server.
+    """
+    global _server
+
+    with _server_lock:
+        if _server is None:
+            _server = FakeLLMServer(script_path)
+            _server.start()
+        return _server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serves scripted chat completions on an OpenAI compatible endpoint"
+    )
+    parser.add_argument("-s", "--script", type=Path, default=DEFAULT_SCRIPT)
+    parser.add_argument("-l", "--latency", type=float, default=None)
+    parser.add_argument("-t", "--tokens_per_second", type=float, default=None)
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(
+        args.script, args.latency, args.tokens_per_second, args.host, args.port
+    )
+    print(f"Serving fake chat completions on {server.url}")
+    server.serve_forever()
@@ -1,5 +1,6 @@
 import os
 import re
+import html
 
 from pathlib import Path
 
@@ -19,6 +20,168 @@ from PySide6.QtWidgets import (
 from src.pipeline import Pipeline
 
 
+# Basic keywords that are highlighted in the code of the developers
+HIGHLIGHTED_KEYWORDS = {
+    "Backend": [
+        "def",
+        "return",
+        "class",
+        "None",
+        "True",
+        "False",
+        "self",
+        "init",
+        "lambda",
+        "global",
+        "nonlocal",
+        "yield",
+        "with",
+        "as",
+        "assert",
+        "del",
+        "from",
+        "global",
+        "nonlocal",
+        "pass",
+        "raise",
+        "yield",
+        "if",
+        "else",
+        "elif",
+        "for",
+        "while",
+        "break",
+        "continue",
+        "try",
+        "except",
+        "finally",
+        "in",
+        "is",
+        "and",
+        "or",
+        "not",
+        "import",
+        "from",
+        "as",
+        "try",
+        "except",
+        "finally",
+        "with",
+        "as",
+        "exec",
+        "print",
+        "int",
+        "float",
+        "str",
+        "list",
+        "dict",
+        "tuple",
+        "set",
+        "bool",
+        "bytes",
+        "object",
+    ],
+    "Database": [
+        "SELECT",
+        "FROM",
+        "WHERE",
+        "GROUP&nbsp;BY",
+        "ORDER&nbsp;BY",
+        "LIMIT",
+        "OFFSET",
+        "HAVING",
+        "DISTINCT",
+        "INSERT INTO",
+        "VALUES",
+        "UPDATE",
+        "SET",
+        "DELETE",
+        "ALTER&nbsp;TABLE",
+        "DROP&nbsp;TABLE",
+        "CREATE&nbsp;TABLE",
+        "CREATE&nbsp;INDEX",
+        "AND",
+        "OR",
+        "NOT",
+        "IN",
+        "BETWEEN",
+        "IS&nbsp;NULL",
+        "IS&nbsp;NOT&nbsp;NULL",
+    ],
+    "Frontend": [
+        "<!DOCTYPE html>",
+        "<html>",
+        "</html>",
+        "<body>",
+        "</body>",
+        "<script>",
+        "</script>",
+        "<style>",
+        "</style>",
+        "<link>",
+        "<meta>",
+        "<head>",
+        "</head>",
+        "<title>",
+        "</title>",
+        "<header>",
+        "</header>",
+        "<footer>",
+        "</footer>",
+        "<main>",
+        "</main>",
+        "<div>",
+        "</div>",
+        "<span>",
+        "</span>",
+        "<p>",
+        "</p>",
+        "<a>",
+        "</a>",
+        "<img>",
+        "<ul>",
+        "<ol>",
+        "<li>",
+        "<section>",
+        "</section>",
+        "<button>",
+        "</button>",
+        "<input>",
+        "<label>",
+        "<form>",
+        "</form>",
+        "<select>",
+        "<option>",
+        "<textarea>",
+        "<table>",
+        "<tr>",
+        "<td>",
+        "<th>",
+        "<thead>",
+        "<tbody>",
+        "<tfoot>",
+    ],
+}
+
+COMMENT_PATTERNS = {
+    "Backend": re.compile(r"(#.*?$)", re.MULTILINE),
+    "Database": re.compile(r"(--.*?$)", re.MULTILINE),
+    "Frontend": re.compile(r"(//.*?$)", re.MULTILINE),
+}
+
+# One alternation per layer instead of one substitution per keyword. Longer keywords are tried first
+KEYWORD_PATTERNS = {
+    layer: re.compile(
+        r"\b("
+        + "|".join(
+            re.escape(kw) for kw in sorted(set(keywords), key=len, reverse=True)
+        )
+        + r")\b"
+    )
+    for layer, keywords in HIGHLIGHTED_KEYWORDS.items()
+}
+
+
 class Gui(QMainWindow):
     to_pipeline_signal = Signal(str)  # For communication with pipeline thread
 
@@ -41,6 +204,9 @@ class Gui(QMainWindow):
         self.pipeline.animation_signal.connect(
             self.__start_animation, Qt.QueuedConnection
         )  # If the pipeline thread emits a signal, call  gui.__start_animation()
+        self.pipeline.token_signal.connect(
+            self.__on_token_received, Qt.QueuedConnection
+        )  # If the pipeline thread streams a token, call gui.__on_token_received()
 
         self.pipeline_thread.started.connect(
             self.pipeline.start
@@ -92,6 +258,9 @@ class Gui(QMainWindow):
         self.is_animation_running = False
         self.dots = 0
 
+        # Message widget that is filled with streamed tokens until the complete message arrives
+        self.streaming_widget = None
+
         # Set layout
         layout = QVBoxLayout()
         layout.addWidget(self.scroll_area)
@@ -180,8 +349,17 @@ class Gui(QMainWindow):
         if self.is_animation_running:
             self.__stop_animation()
 
-        message_widget = ChatMessageWidget(sender, message)
-        self.scroll_layout.insertWidget(-1, message_widget)
+        if (
+            self.streaming_widget is not None
+            and self.streaming_widget.sender_name == sender
+        ):
+            # Replace the streamed raw text with the final, formatted message
+            self.streaming_widget.set_message(message)
+        else:
+            message_widget = ChatMessageWidget(sender, message)
+            self.scroll_layout.insertWidget(-1, message_widget)
+        self.streaming_widget = None
+
         QTimer.singleShot(
             100,
             lambda: self.scroll_area.verticalScrollBar().setValue(
@@ -194,6 +372,25 @@ class Gui(QMainWindow):
         else:
             self.to_pipeline_signal.emit(None)  # Continue pipeline execution
 
+    def __on_token_received(self, sender, token):
+        if self.is_animation_running:
+            self.__stop_animation()
+
+        if (
+            self.streaming_widget is None
+            or self.streaming_widget.sender_name != sender
+        ):
+            self.streaming_widget = ChatMessageWidget(sender, "")
+            self.scroll_layout.insertWidget(-1, self.streaming_widget)
+
+        self.streaming_widget.append_text(token)
+        QTimer.singleShot(
+            100,
+            lambda: self.scroll_area.verticalScrollBar().setValue(
+                self.scroll_area.verticalScrollBar().maximum()
+            ),
+        )
+
     def __on_send_clicked(self):
         user_input = self.text_input.text()
         self.text_input.clear()
@@ -259,6 +456,8 @@ class Gui(QMainWindow):
 class ChatMessageWidget(QWidget):
     def __init__(self, sender, message):
         super().__init__()
+        self.sender_name = sender
+        self.streamed_text = ""
 
         # Construct the path to the image
         image_path = str(
@@ -301,8 +500,7 @@ class ChatMessageWidget(QWidget):
         # Text Label
         self.text_label = QLabel(self)
         self.text_label.setOpenExternalLinks(True)
-        formatted_message = self.__add_formatting(sender, message)
-        self.text_label.setText(f"<b>{sender}</b>: {formatted_message}")
+        self.set_message(message)
         self.text_label.setWordWrap(True)
         text_background_color = "#C8CFE3" if sender == "You" else "#E2DED4"
         self.text_label.setStyleSheet(
@@ -332,6 +530,16 @@ class ChatMessageWidget(QWidget):
 
         self.setLayout(layout)
 
+    def set_message(self, message):
+        formatted_message = self.__add_formatting(self.sender_name, message)
+        self.text_label.setText(f"<b>{self.sender_name}</b>: {formatted_message}")
+
+    def append_text(self, text):
+        """Appends a streamed token. The text is shown unformatted until set_message is called"""
+        self.streamed_text += text
+        escaped_text = html.escape(self.streamed_text).replace("\n", "<br>")
+        self.text_label.setText(f"<b>{self.sender_name}</b>: {escaped_text}")
+
     def __translate_name(self, name):
         """For debugging purposes until final decision on names is made"""
         d = {
@@ -371,179 +579,13 @@ class ChatMessageWidget(QWidget):
             message = message.replace(" ", "&nbsp;")
             message = message.replace("<", "&lt;").replace(">", "&gt;")
 
-            # Comment highlighting
-            if layer == "Backend":
-                message = re.sub(
-                    r"(#.*?$)",
-                    r'<span style="color: gray; font-style: italic;">\1</span>',
-                    message,
-                    flags=re.MULTILINE,
-                )
-            elif layer == "Database":
-                message = re.sub(
-                    r"(--.*?$)",
-                    r'<span style="color: gray; font-style: italic;">\1</span>',
-                    message,
-                    flags=re.MULTILINE,
-                )
-            elif layer == "Frontend":
-                message = re.sub(
-                    r"(//.*?$)",
-                    r'<span style="color: gray; font-style: italic;">\1</span>',
-                    message,
-                    flags=re.MULTILINE,
-                )
-
-            # Define basic keywords that should be highlighted
-            keywords = {
-                "Backend": [
-                    "def",
-                    "return",
-                    "class",
-                    "None",
-                    "True",
-                    "False",
-                    "self",
-                    "init",
-                    "lambda",
-                    "global",
-                    "nonlocal",
-                    "yield",
-                    "with",
-                    "as",
-                    "assert",
-                    "del",
-                    "from",
-                    "global",
-                    "nonlocal",
-                    "pass",
-                    "raise",
-                    "yield",
-                    "if",
-                    "else",
-                    "elif",
-                    "for",
-                    "while",
-                    "break",
-                    "continue",
-                    "try",
-                    "except",
-                    "finally",
-                    "in",
-                    "is",
-                    "and",
-                    "or",
-                    "not",
-                    "import",
-                    "from",
-                    "as",
-                    "try",
-                    "except",
-                    "finally",
-                    "with",
-                    "as",
-                    "exec",
-                    "print",
-                    "int",
-                    "float",
-                    "str",
-                    "list",
-                    "dict",
-                    "tuple",
-                    "set",
-                    "bool",
-                    "bytes",
-                    "object",
-                ],
-                "Database": [
-                    "SELECT",
-                    "FROM",
-                    "WHERE",
-                    "GROUP&nbsp;BY",
-                    "ORDER&nbsp;BY",
-                    "LIMIT",
-                    "OFFSET",
-                    "HAVING",
-                    "DISTINCT",
-                    "INSERT INTO",
-                    "VALUES",
-                    "UPDATE",
-                    "SET",
-                    "DELETE",
-                    "ALTER&nbsp;TABLE",
-                    "DROP&nbsp;TABLE",
-                    "CREATE&nbsp;TABLE",
-                    "CREATE&nbsp;INDEX",
-                    "AND",
-                    "OR",
-                    "NOT",
-                    "IN",
-                    "BETWEEN",
-                    "IS&nbsp;NULL",
-                    "IS&nbsp;NOT&nbsp;NULL",
-                ],
-                "Frontend": [
-                    "<!DOCTYPE html>",
-                    "<html>",
-                    "</html>",
-                    "<body>",
-                    "</body>",
-                    "<script>",
-                    "</script>",
-                    "<style>",
-                    "</style>",
-                    "<link>",
-                    "<meta>",
-                    "<head>",
-                    "</head>",
-                    "<title>",
-                    "</title>",
-                    "<header>",
-                    "</header>",
-                    "<footer>",
-                    "</footer>",
-                    "<main>",
-                    "</main>",
-                    "<div>",
-                    "</div>",
-                    "<span>",
-                    "</span>",
-                    "<p>",
-                    "</p>",
-                    "<a>",
-                    "</a>",
-                    "<img>",
-                    "<ul>",
-                    "<ol>",
-                    "<li>",
-                    "<section>",
-                    "</section>",
-                    "<button>",
-                    "</button>",
-                    "<input>",
-                    "<label>",
-                    "<form>",
-                    "</form>",
-                    "<select>",
-                    "<option>",
-                    "<textarea>",
-                    "<table>",
-                    "<tr>",
-                    "<td>",
-                    "<th>",
-                    "<thead>",
-                    "<tbody>",
-                    "<tfoot>",
-                ],
-            }
-
-            # Apply keyword highlighting
-            for kw in keywords[layer]:
-                message = re.sub(
-                    r"\b" + re.escape(kw) + r"\b",
-                    f'<span style="color: #4654B3; font-weight: bold;">{kw}</span>',
-                    message,
-                )
+            # Comment and keyword highlighting. The patterns are compiled once at the top of the module
+            message = COMMENT_PATTERNS[layer].sub(
+                r'<span style="color: gray; font-style: italic;">\1</span>', message
+            )
+            message = KEYWORD_PATTERNS[layer].sub(
+                r'<span style="color: #4654B3; font-weight: bold;">\1</span>', message
+            )
 
         # Add line breaks
         if role == "Doc" or role == "Dev":
@@ -0,0 +1,121 @@
+import re
+import difflib
+
+from typing import List, Optional
+
+from src.utils import MessageParser
+
+
+# Parser of the developer answers in diff mode
+DIFF_PARSER = MessageParser({"type": "code", "use_parser": True, "fields": ["diff"]})
+
+# The line numbers are optional, models often write a bare "@@ @@"
+HUNK_HEADER = re.compile(r"^@@\s*(?:-(\d+)(?:,\d+)?)?\s*(?:\+\d+(?:,\d+)?)?\s*@@")
+
+
+class PatchError(ValueError):
+    """Raised if a diff is malformed or does not fit the code it should be applied to"""
+
+
+def parse_hunks(diff: str) -> List[dict]:
+    """
+    Splits a unified diff into its hunks.
+
+    Args:
+        diff (str): The unified diff.
+
+    Returns:
+        List[dict]: The hunks with the line they start at ("start", None if the header has no numbers), the lines
+            they replace ("old") and the lines they are replaced with ("new").
+    """
+    hunks = []
+    for line in diff.splitlines():
+        header = HUNK_HEADER.match(line)
+        if header is not None:
+            start = int(header.group(1)) if header.group(1) is not None else None
+            hunks.append({"start": start, "old": [], "new": []})
+        elif not hunks:
+            # File headers like "--- a/index.py" or "diff --git ..." before the first hunk
+            if line.strip() and not line.startswith(("---", "+++", "diff ", "index ")):
+                raise PatchError(f"The diff has a line outside of a hunk: {line}")
+        elif line.startswith("+"):
+            hunks[-1]["new"].append(line[1:])
+        elif line.startswith("-"):
+            hunks[-1]["old"].append(line[1:])
+        elif line.startswith("\\"):
+            continue  # "\ No newline at end of file"
+        else:
+            # Models often drop the leading space of empty context lines
+            context = line[1:] if line.startswith(" ") else line
+            hunks[-1]["old"].append(context)
+            hunks[-1]["new"].append(context)
+
+    if not hunks:
+        raise PatchError("The diff does not contain any hunk starting with @@")
+    return hunks
+
+
+def _find_block(lines: List[str], block: List[str], cursor: int, hint: Optional[int]) -> int:
+    """Returns the position of the block at or after the cursor that is closest to the hinted position or -1"""
+    block = [line.rstrip() for line in block]
+    positions = [
+        position
+        for position in range(cursor, len(lines) - len(block) + 1)
+        if lines[position].rstrip() == block[0]
+        and [line.rstrip() for line in lines[position : position + len(block)]] == block
+    ]
+    if not positions:
+        return -1
+    if hint is None:
+        return positions[0]
+    return min(positions, key=lambda position: abs(position - hint))
+
+
+def apply_patch(code: str, diff: str) -> str:
+    """
+    Applies a unified diff to the code. The line numbers of the hunks are only used as hint, because models often
+    get them wrong. The lines that a hunk replaces have to be found exactly (up to trailing whitespace).
+
+    Args:
+        code (str): The code the diff was written against.
+        diff (str): The unified diff.
+
+    Returns:
+        str: The patched code. Raises PatchError if the diff is malformed or a hunk does not fit the code.
+    """
+    lines = code.splitlines()
+    cursor, offset = 0, 0  # Hunks are applied in order. Offset is the shift of the line numbers by previous hunks
+    for hunk in parse_hunks(diff):
+        hint = hunk["start"] - 1 + offset if hunk["start"] is not None else None
+
+        if not hunk["old"]:
+            # Pure insertion, the line number is the only anchor
+            if hint is None:
+                raise PatchError("A hunk only adds lines, but its header has no line numbers")
+            position = min(max(hint + 1, cursor), len(lines))
+        else:
+            position = _find_block(lines, hunk["old"], cursor, hint)
+            if position == -1:
+                raise PatchError(
+                    f"The lines of a hunk were not found in the code: {hunk['old'][0].strip()}"
+                )
+
+        lines[position : position + len(hunk["old"])] = hunk["new"]
+        cursor = position + len(hunk["new"])
+        offset += len(hunk["new"]) - len(hunk["old"])
+
+    return "\n".join(lines) + ("\n" if code.endswith("\n") else "")
+
+
+def unified_diff(old_code: str, new_code: str, context: int = 5) -> str:
+    """Returns the changes between two versions of the code as unified diff with the given number of context lines"""
+    return "\n".join(
+        difflib.unified_diff(
+            old_code.splitlines(),
+            new_code.splitlines(),
+            "before",
+            "after",
+            n=context,
+            lineterm="",
+        )
+    )
@@ -1,23 +1,43 @@
 import time
 import json
+import asyncio
 import string
 import random
-import datetime
+import logging
 
-from typing import Union
+from typing import Optional, Union
 from pathlib import Path
 from langchain.prompts import PromptTemplate
 
 from PySide6.QtCore import QObject, Signal, QThread, QCoreApplication
 
 from src.utils import *
-from src.agents import Agent, HumanConversationWrapper
+from src.cache import DiskCache
+from src.clients import aclose_http_clients
+from src.budget import DEFAULT_TURN_BUDGET, ProgressTracker, learn_turn_budget
+from src.usage import summarize_calls
+from src.prechecks import run_precheck
+from src.patch import DIFF_PARSER, PatchError, apply_patch, unified_diff
+from src.contracts import backend_contract, database_contract, describe_contracts
+from src.fakeserver import get_fake_server
+from src.agents import Agent, HumanConversationWrapper, load_agent_configs
+from src.sandbox.images import BACKEND_DEPENDENCIES
 from src.sandbox.instantiate import PythonSandbox, FrontendSandbox, DatabaseSandbox
 
+# Parser of the tasks that the orchestrator devises for the layers
+REQUIREMENTS_PARSER = MessageParser(
+    {
+        "type": "json",
+        "use_parser": True,
+        "fields": "[('database', str), ('backend', str), ('frontend', str)]",
+    }
+)
+
 
 class Pipeline(QObject):
     message_signal = Signal(str, str, bool)  # For communication with GUI thread
     animation_signal = Signal(str)  # layer, status, on/off
+    token_signal = Signal(str, str)  # sender, streamed token
 
     def __init__(self, command_line_args, evaluate_index: int = None):
         super().__init__()
@@ -33,14 +53,46 @@ class Pipeline(QObject):
         self.disable_gui = (
             command_line_args.disable_gui
         )  # Whether to disable GUI and run in terminal only
+        self.stream = getattr(
+            command_line_args, "stream", False
+        )  # Whether to stream the agents' answers token by token
         self.evaluate_index = evaluate_index  # Only used for evaluation purposes
-
+        fake_llm = getattr(command_line_args, "fake_llm", None)
+        self.llm_base_url = (
+            get_fake_server(self.root / fake_llm).url if fake_llm else None
+        )  # All agents talk to the local fake LLM server instead of OpenAI
+        self.cache = (
+            None
+            if getattr(command_line_args, "no_cache", False) or fake_llm
+            else DiskCache(self.root / "cache/responses.sqlite")
+        )  # Persistent cache for agent responses, shared by all agents. Benchmarks against the fake server skip it
+        self.sandbox_cache = (
+            None
+            if getattr(command_line_args, "no_cache", False)
+            else DiskCache(self.root / "cache/sandbox.sqlite", max_entries=1000)
+        )  # Persistent cache for the logs of code that already ran in a sandbox
+
+        self.__streaming_sender = None  # Agent whose answer is currently streamed
+        self.candidates = max(
+            1, getattr(command_line_args, "candidates", 1) or 1
+        )  # Number of developer candidates that are tried concurrently per turn
+        self.hot_reload = getattr(
+            command_line_args, "hot_reload", False
+        )  # Whether the backend container keeps running and only restarts the script between turns
+        self.__sandbox_runs = {}  # Latest sandbox execution per container
+        self.__deployed_code = {}  # Code that is actually running in each container (cached runs are not deployed)
+        self.__database_task = None  # Database container is started concurrently to the first LLM calls
+        self.__database_sandbox = None  # Kept to reset the database between backend turns
         self.__metrics = (
             self.__setup_metrics()
         )  # Metrics that are collected during the development process
-        self.__setup_agents()  # Create workforce using agents.json
+        self.__agent_configs = {
+            config["varname"]: config
+            for config in load_agent_configs(self.root / "src/setup/agents.json")
+        }  # Workforce from agents.json. Agents are created on first access
 
     def __transmit_message_signal(self, sender, message, is_question=False):
+        self.__end_token_stream()
         print(f"\033[34m{sender}:\033[0m {message}")
         if self.disable_gui:
             if is_question:
@@ -57,28 +109,55 @@ class Pipeline(QObject):
             return self._input
 
     def __transmit_animation_signal(self, text):
+        self.__end_token_stream()
         print(f"\033[32m{text}\033[0m")  # green formatting
         self.animation_signal.emit(text)
 
+    def __transmit_token_signal(self, sender, token):
+        if self.disable_gui:
+            if self.__streaming_sender != sender:
+                print(f"\033[90m{sender}:\033[0m ", end="")
+            print(f"\033[90m{token}\033[0m", end="", flush=True)  # gray formatting
+        else:
+            self.token_signal.emit(sender, token)
+        self.__streaming_sender = sender
+
+    def __end_token_stream(self):
+        if self.__streaming_sender is not None and self.disable_gui:
+            print()  # Finish the line of streamed tokens
+        self.__streaming_sender = None
+
+    def __token_callback(self, agent: Agent):
+        """Returns the callback that streams the tokens of an agent or None if streaming is disabled"""
+        if not self.stream:
+            return None
+        return lambda token: self.__transmit_token_signal(agent.name, token)
+
     def receive_from_gui(self, input):
         self._input = input
         self._pause_execution = False
 
-    def __setup_agents(self) -> None:
-        """Create workforce using agents.json"""
-        with open(self.root / "src/setup/agents.json", "r") as file:
-            configs = json.load(file)
-
-        for config in configs:
-            setattr(
-                self,
-                config["varname"],
-                Agent(
-                    config=config,
-                    root=self.root,
-                ),
+    def __getattr__(self, name: str) -> Agent:
+        """Creates an agent of the workforce on first access (e.g. self.orchestrator) and keeps it as attribute"""
+        agent_configs = self.__dict__.get("_Pipeline__agent_configs", {})
+        if name not in agent_configs:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
             )
 
+        config = agent_configs[name]
+        if self.llm_base_url is not None:
+            config = {**config, "base_url": self.llm_base_url}
+
+        agent = Agent(
+            config=config,
+            root=self.root,
+            cache=self.cache,
+            on_call=self.__record_call,
+        )
+        setattr(self, name, agent)
+        return agent
+
     def __setup_metrics(self) -> dict:
         return {
             "project_name": None,
@@ -88,13 +167,68 @@ class Pipeline(QObject):
             "turns_frontend": 0,
             "working": 0,
             "human_feedback": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "llm_calls": [],  # One record per Agent.answer call
+            "llm_per_layer": {},
+            "llm_per_agent": {},
+            "sandbox_time": {"database": 0, "backend": 0, "frontend": 0},
+            "sandbox_cache_hits": {"database": 0, "backend": 0, "frontend": 0},
+            "escalations": [],  # Model cascade steps of the developers
+            "precheck_failures": {"database": 0, "backend": 0, "frontend": 0},
+            "precheck_warnings": {"database": 0, "backend": 0, "frontend": 0},
+            "unchanged_turns": {"database": 0, "backend": 0, "frontend": 0},  # Turns that repeated the previous code
+            "applied_diffs": {"database": 0, "backend": 0, "frontend": 0},  # Followups answered with a diff
+            "diff_fallbacks": {"database": 0, "backend": 0, "frontend": 0},  # Diffs that did not apply
+            "candidates": self.candidates,
+            "accepted_candidate": {},  # Index of the kept candidate per layer
+            "contract_chars": {},  # Size of the contract and of the prose documentation per layer
+            "turn_budget": {},  # Turns a layer was allowed to take, learned from previous evaluations
+            "early_aborts": [],  # Layers whose dev/test loop was stopped because it made no progress
         }
 
     def __add_metrics(self, key: str, value: Union[int, str]) -> None:
         self.__metrics[key] = value
 
+    def __record_call(self, call: dict) -> None:
+        """Receives the record of every LLM call. The layer is derived from the varname of the agent"""
+        layer = call["agent"].split("_")[0]
+        call["layer"] = layer if layer in ["database", "backend", "frontend"] else call["agent"]
+        self.__metrics["llm_calls"].append(call)
+
+    def __escalate(self, agent: Agent, layer: str, turn: int, reason: str) -> bool:
+        """Escalates the agent to the next model of its cascade. Returns False if it already uses its strongest model"""
+        escalation = agent.escalate()
+        if escalation is not None:
+            previous_model, model = escalation
+            self.__metrics["escalations"].append(
+                {
+                    "agent": agent.varname,
+                    "layer": layer,
+                    "turn": turn + 1,
+                    "reason": reason,
+                    "from": previous_model,
+                    "to": model,
+                }
+            )
+        return escalation is not None
+
+    def __add_sandbox_time(self, layer: str, start_time: float) -> None:
+        self.__metrics["sandbox_time"][layer] = round(
+            self.__metrics["sandbox_time"][layer] + time.time() - start_time, 3
+        )
+
     @property
-    def metrics(self) -> None:
+    def metrics(self) -> dict:
+        if self.cache is not None:
+            self.__add_metrics("cache_hits", self.cache.hits)
+            self.__add_metrics("cache_misses", self.cache.misses)
+        self.__add_metrics(
+            "llm_per_layer", summarize_calls(self.__metrics["llm_calls"], "layer")
+        )
+        self.__add_metrics(
+            "llm_per_agent", summarize_calls(self.__metrics["llm_calls"], "agent")
+        )
         return self.__metrics
 
     def __create_project_name(self, title: str = "Webapp") -> str:
@@ -108,8 +242,258 @@ class Pipeline(QObject):
         self.project_name = project_name
         return project_name
 
+    def __create_candidate_sandbox(self, layer: str, index: int):
+        """Creates an isolated sandbox with its own folder, container and port for a candidate"""
+        if layer == "backend":
+            return PythonSandbox(
+                self.title,
+                subfolder_path=f"candidates/backend_{index}",
+                container_name=f"backend_candidate_{index}",
+                image_tag=f"python_webserver_candidate_{index}:latest",
+                host_port=str(8100 + index),
+                hot_reload=self.hot_reload,
+                database=f"backend_candidate_{index}",
+            )
+        elif layer == "frontend":
+            return FrontendSandbox(
+                self.title,
+                subfolder_path=f"candidates/frontend_{index}",
+                container_name=f"frontend_candidate_{index}",
+                image_tag=f"nginx_webserver_candidate_{index}:latest",
+                host_port=str(8180 + index),
+            )
+        return None  # Database code is not executed
+
+    async def __execute_in_sandbox(
+        self, layer: str, sandbox, code: str, use_cache: bool = True
+    ) -> str:
+        """Runs the code in the sandbox (or takes the result from the sandbox cache) and returns the log statement for the tester"""
+        # A cancelled candidate might still be running in its sandbox. Wait for it before reusing the sandbox
+        previous_run = self.__sandbox_runs.get(sandbox.container_name)
+        if previous_run is not None:
+            await asyncio.wait([previous_run])
+
+        self.__transmit_animation_signal(f"Running code in {layer} container")
+        dependencies = BACKEND_DEPENDENCIES if layer == "backend" else None
+        sandbox_start_time = time.time()
+
+        # Shielded, so that cancelling a candidate does not leave the sandbox in an unknown state
+        run_task = asyncio.ensure_future(
+            asyncio.to_thread(
+                sandbox.execute,
+                code,
+                dependencies,
+                self.sandbox_cache if use_cache else None,
+            )
+        )
+        self.__sandbox_runs[sandbox.container_name] = run_task
+        result = await asyncio.shield(run_task)
+
+        if result["cached"]:
+            self.__metrics["sandbox_cache_hits"][layer] += 1
+        else:
+            self.__deployed_code[sandbox.container_name] = code
+        self.__add_sandbox_time(layer, sandbox_start_time)
+        docker_logs = result["logs"]
+        print(f"\033[38;5;208m{'Docker logs: '}\033[0m", docker_logs)
+        return f"These are the last few log statements that one gets when running the code in a dedicated docker container:\n{docker_logs}"
+
+    async def __try_candidate(
+        self,
+        layer: str,
+        index: int,
+        developer: Agent,
+        tester: Agent,
+        sandbox,
+        dev_query: str,
+        reset_task: Optional[asyncio.Task],
+        backend_docs: str,
+        transmit: bool,
+        previous: Optional[dict],
+        fallback_query: Optional[str] = None,
+        diff_review: bool = False,
+    ) -> dict:
+        """
+        Lets the developer write one candidate, runs it in its sandbox and asks the tester for a verdict. If a
+        fallback query is given, the developer was asked for a diff against the previous code. The fallback query asks
+        for the whole code in case the diff can not be applied. With diff_review, the tester only gets the changes
+        since the previous code.
+        """
+        # Candidates after the first one use a higher temperature to get different solutions
+        temperature = (
+            None
+            if index == 0
+            else min(1.0, developer.config["temperature"] + 0.2 * index)
+        )
+        # A diff answer has to end after the diff snippet, not after the first code snippet
+        dev_answer = await developer.aanswer(
+            dev_query,
+            on_token=self.__token_callback(developer) if transmit else None,
+            temperature=temperature,
+            remember=False,
+            parser=DIFF_PARSER if fallback_query is not None else None,
+        )
+
+        diff_code = None
+        if fallback_query is not None:
+            try:
+                diff_code = apply_patch(
+                    previous["code"], developer.parse(dev_answer, parser=DIFF_PARSER)
+                )
+                self.__metrics["applied_diffs"][layer] += 1
+            except (ParseError, PatchError) as e:
+                # Conflicting or malformed diff. The developer writes the whole code instead
+                logging.info(f"The diff of {developer.name} could not be applied: {e}")
+                self.__metrics["diff_fallbacks"][layer] += 1
+                dev_query = fallback_query
+                dev_answer = await developer.aanswer(
+                    dev_query,
+                    on_token=self.__token_callback(developer) if transmit else None,
+                    temperature=temperature,
+                    remember=False,
+                )
+        candidate = {"index": index, "dev_query": dev_query, "dev_answer": dev_answer}
+
+        if reset_task is not None:
+            sandbox_start_time = time.time()
+            try:
+                await asyncio.shield(reset_task)
+            except RuntimeError as e:
+                # The database container is shared with the other candidates, so it is not recreated for one of them
+                logging.warning(f"Candidate {index} is tested without a clean database: {e}")
+            self.__add_sandbox_time("database", sandbox_start_time)
+
+        try:
+            candidate["dev_code"] = (
+                diff_code if diff_code is not None else developer.parse(dev_answer)
+            )
+        except ParseError:
+            candidate["dev_code"] = None
+            return candidate
+
+        if transmit:
+            self.__transmit_message_signal(
+                sender=developer.name, message=candidate["dev_code"]
+            )
+
+        # The same code would produce the same logs and the same verdict, so the previous verdict is reused
+        if previous is not None and code_hash(candidate["dev_code"], layer) == previous["hash"]:
+            candidate.update(
+                tester_query=None,
+                tester_answer=None,
+                accepted=False,
+                tester_message=previous["tester_message"],
+                unchanged=True,
+            )
+            return candidate
+
+        # Code that does not even compile goes straight back to the developer, without a Docker build and a tester call
+        precheck_message, precheck_warnings = run_precheck(layer, candidate["dev_code"])
+        if precheck_message is not None:
+            candidate.update(
+                tester_query=None,
+                tester_answer=None,
+                accepted=False,
+                tester_message=precheck_message,
+                precheck_failed=True,
+            )
+            return candidate
+
+        # Execute code in docker container
+        log_string = ""
+        if layer != "database":
+            log_string = await self.__execute_in_sandbox(
+                layer, sandbox, candidate["dev_code"]
+            )
+        if precheck_warnings is not None:
+            # Heuristic findings can be wrong, so the tester decides about them
+            candidate["precheck_warnings"] = True
+            log_string = f"{log_string}\n{precheck_warnings}".strip()
+
+        # Send message, code and docker logs to tester agent
+        # A tester that still remembers the previous code only gets the changes (with some lines around them)
+        code = candidate["dev_code"]
+        if diff_review:
+            code = (
+                "The code was changed since your last review. These are the changes as unified diff:\n"
+                f"```diff\n{unified_diff(previous['code'], code)}\n```"
+            )
+        tester_query = tester.get_prompt_text("followup").format(
+            code=code, docker_logs=log_string, backend_docs=backend_docs
+        )
+        if transmit:
+            self.__transmit_animation_signal(f"{tester.name} is typing")
+        # Vision takes up about 5100 tokens. The rate limit of the vision model (see src/setup/rate_limits.json) allows using it just once per minute.
+        # use_vision = True if layer == "frontend" and turn == 0 else False
+        use_vision = False
+        tester_answer = await tester.aanswer(
+            tester_query,
+            use_vision=use_vision,
+            on_token=self.__token_callback(tester) if transmit else None,
+            remember=False,
+        )
+        try:
+            tester_dict = await tester.aparse(tester_answer)
+            accepted, tester_message = tester_dict["accepted"], tester_dict["text"]
+        except ParseError:
+            # Even the corrected verdict was unreadable. Never accept code that was not reviewed
+            accepted, tester_message = (
+                False,
+                "The review of your code failed. Check the code for errors once more and answer with the complete code.",
+            )
+
+        candidate.update(
+            tester_query=tester_query,
+            tester_answer=tester_answer,
+            accepted=accepted,
+            tester_message=tester_message,
+        )
+        return candidate
+
+    async def __race_candidates(self, coroutines: list) -> list:
+        """Runs the candidates concurrently until the first one is accepted. The remaining ones are cancelled"""
+        tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+        finished = []
+        try:
+            for next_finished in asyncio.as_completed(tasks):
+                candidate = await next_finished
+                finished.append(candidate)
+                if candidate.get("accepted"):
+                    break
+        finally:
+            for task in tasks:
+                task.cancel()
+            # Wait until the cancelled candidates have stopped, so that they do not overlap with the next turn
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return finished
+
+    def __select_candidate(self, finished: list) -> dict:
+        """Prefers an accepted candidate, then the first tested one, then one rejected by the pre-check. Candidates without code are the last resort"""
+        for candidate in finished:
+            if candidate.get("accepted"):
+                return candidate
+        for candidate in finished:
+            if candidate.get("tester_query") is not None:
+                return candidate
+        for candidate in finished:
+            if candidate["dev_code"] is not None:
+                return candidate
+        return finished[0]
+
+    async def __run_and_close(self, coroutine):
+        """Awaits the coroutine and closes the HTTP clients of its event loop afterwards"""
+        try:
+            return await coroutine
+        finally:
+            await aclose_http_clients()
+
     def start(self) -> None:
-        """Start developing process"""
+        """Start developing process. Blocks until the asyncio driver has finished"""
+        asyncio.run(self.__run_and_close(self.astart()))
+
+    async def astart(self) -> None:
+        """Asyncio driver of the developing process. Independent LLM calls and sandbox work are awaited concurrently"""
         # 0. Setup. Time difference between start and end of development process is measured
         start_time = time.time()
 
@@ -127,7 +511,7 @@ class Pipeline(QObject):
             )
 
             # Iterate over conversation with user until all requirements are understood
-            for ai_message in conversation_with_user:
+            async for ai_message in conversation_with_user:
                 sender, message = ai_message
                 if not conversation_with_user.is_accepted():
                     user_response = self.__transmit_message_signal(
@@ -157,21 +541,39 @@ class Pipeline(QObject):
             self.__transmit_message_signal(sender="You", message=summaries[summary_key])
 
         # 0b. Orchestrator devises tasks for database, backend & frontend devs based on user requirements
-        summarization_task = self.orchestrator.get_prompt_text("summarize")
-        requirements = self.orchestrator.answer(summarization_task)
-        requirements = parse_message(
-            requirements,
-            parser={
-                "type": "json",
-                "use_parser": True,
-                "fields": "[('database', str), ('backend', str), ('frontend', str)]",
-            },
+        # The database container does not depend on the requirements, so it is started in the meantime
+        self.__database_task = asyncio.create_task(
+            asyncio.to_thread(DatabaseSandbox, self.title)
+        )
+        requirements = None
+        try:
+            summarization_task = self.orchestrator.get_prompt_text("summarize")
+            summary = await self.orchestrator.aanswer(
+                summarization_task, parser=REQUIREMENTS_PARSER
+            )
+            requirements = await self.orchestrator.aparse(
+                summary, parser=REQUIREMENTS_PARSER
+            )
+        finally:
+            if requirements is None:
+                # Nothing waits for the database container anymore. Its outcome is retrieved anyway, so that a
+                # failed start is not reported as a never retrieved exception
+                self.__database_task.cancel()
+                await asyncio.gather(self.__database_task, return_exceptions=True)
+                self.__database_task = None
+
+        # The following layers get the compact contracts of the previous layers. The prose documentation is only
+        # used for the final message (and if a layer has no contract)
+        docs, contracts = {}, {}
+        database_code, docs["database"], contracts["database"] = await self.adevelop(
+            "database", requirements, docs, contracts
+        )
+        backend_code, docs["backend"], contracts["backend"] = await self.adevelop(
+            "backend", requirements, docs, contracts
+        )
+        frontend_code, docs["frontend"], contracts["frontend"] = await self.adevelop(
+            "frontend", requirements, docs, contracts
         )
-
-        docs = {}
-        database_code, docs["database"] = self.develop("database", requirements, docs)
-        backend_code, docs["backend"] = self.develop("backend", requirements, docs)
-        frontend_code, docs["frontend"] = self.develop("frontend", requirements, docs)
         docs_as_string = "".join(
             [
                 f"Here is the documentation for the {layer}: {doc}\n"
@@ -182,7 +584,11 @@ class Pipeline(QObject):
         self.__transmit_animation_signal(f"{self.orchestrator.name} is typing")
         final_prompt = self.orchestrator.get_prompt_text("finalize")
         final_prompt = final_prompt.format(docs=docs_as_string)
-        final_message = self.orchestrator.answer(final_prompt)
+        final_message = await self.orchestrator.aanswer(
+            final_prompt,
+            on_token=self.__token_callback(self.orchestrator),
+            parsed=False,  # The final message is free text
+        )
         self.__transmit_message_signal(
             sender=self.orchestrator.name, message=final_message
         )
@@ -190,22 +596,34 @@ class Pipeline(QObject):
         # End of development process
         self.__add_metrics("time", int(time.time() - start_time))
 
-    def develop(self, layer, requirements, docs):
+    def develop(self, layer, requirements, docs, contracts=None):
+        """Synchronous wrapper around adevelop"""
+        return asyncio.run(
+            self.__run_and_close(self.adevelop(layer, requirements, docs, contracts))
+        )
+
+    async def adevelop(self, layer, requirements, docs, contracts=None):
         # Get agents for layer
         developer, tester, documenter = (
             getattr(self, layer + "_dev"),
             getattr(self, layer + "_test"),
             getattr(self, layer + "_doc"),
         )
-        # Start corresponding docker container
+        # Start corresponding docker container. The database container might already be starting
         self.__transmit_animation_signal(f"Building docker container for {layer}")
-        docker_sandbox = (
-            DatabaseSandbox(self.title)
-            if layer == "database"
-            else PythonSandbox(self.title)
-            if layer == "backend"
-            else FrontendSandbox(self.title)
-        )
+        if layer == "database":
+            sandbox_start_time = time.time()
+            docker_sandbox = (
+                await self.__database_task
+                if self.__database_task is not None
+                else await asyncio.to_thread(DatabaseSandbox, self.title)
+            )
+            self.__add_sandbox_time("database", sandbox_start_time)
+            self.__database_sandbox = docker_sandbox
+        elif layer == "backend":
+            docker_sandbox = PythonSandbox(self.title, hot_reload=self.hot_reload)
+        else:
+            docker_sandbox = FrontendSandbox(self.title)
 
         # 1a. Delegation: Orchestrator & Dev - Layer Dev receives tasks from Orchestrator
         # Only for UX purposes. No actual message is sent
@@ -215,94 +633,226 @@ class Pipeline(QObject):
         # 1b. Conversation: Dev & Tester
         developer_kickoff = developer.get_prompt_text("kickoff")
         developer_followup = developer.get_prompt_text("followup")
-        tester_followup = tester.get_prompt_text("followup")
+        developer_unchanged = developer.get_prompt_text("unchanged")
+        # Developers with a diff prompt answer followups with a diff instead of the whole code
+        developer_diff_followup = (
+            developer.get_prompt_text("diff_followup")
+            if "diff_followup" in developer.config["prompts"]
+            else None
+        )
+        # The frontend tester checks that there is one element for every endpoint of the backend
+        backend_docs = (
+            describe_contracts(
+                {"backend": (contracts or {}).get("backend")},
+                {"backend": docs["backend"]},
+            )
+            if layer == "frontend"
+            else ""
+        )
 
-        for turn in range(7):
-            # If the backend tester didnt accept the backend code, reset the database container,
-            # so that the amended backend code can be tested in a clean environment
-            if turn != 0 and layer == "backend":
-                DatabaseSandbox(self.title)
+        # Every candidate gets its own sandbox, so that they can run in parallel
+        candidate_sandboxes = (
+            [
+                self.__create_candidate_sandbox(layer, index)
+                for index in range(self.candidates)
+            ]
+            if self.candidates > 1
+            else [docker_sandbox]
+        )
+
+        # The budget covers the turns that the layer needed in most of the previous evaluations
+        budget_config = {**DEFAULT_TURN_BUDGET, **developer.config.get("turn_budget", {})}
+        turn_budget = learn_turn_budget(self.root / "evaluate", layer, budget_config)
+        self.__metrics["turn_budget"][layer] = turn_budget
+        progress = ProgressTracker(budget_config["patience"], budget_config["similarity"])
+
+        # Concurrent backend candidates get a database of their own in the database container, so that their
+        # statements can not interfere with each other
+        if layer == "backend" and self.candidates > 1 and self.__database_sandbox is None:
+            self.__database_sandbox = await asyncio.to_thread(DatabaseSandbox, self.title)
+
+        dev_code = ""
+        previous = None  # Hash and verdict of the code of the previous turn
+        # Reviews since the tester got the whole code or None if it never did. The tester only remembers the last
+        # few reviews, so it gets the whole code again once the last whole code has left its memory
+        reviews_since_full_code = None
+        parse_failed = False  # The previous answer did not contain the code snippet
+        rejections = 0
+        for turn in range(turn_budget):
+            # If the backend tester didnt accept the backend code, reset the database,
+            # so that the amended backend code can be tested in a clean environment.
+            # The reset runs while the developer is writing the amended code
+            reset_tasks = [None] * self.candidates
+            if layer == "backend" and self.candidates > 1:
+                # Also in the first turn, because the databases of the candidates do not exist yet
+                reset_tasks = [
+                    asyncio.create_task(
+                        asyncio.to_thread(self.__database_sandbox.reset, sandbox.database)
+                    )
+                    for sandbox in candidate_sandboxes
+                ]
+            elif turn != 0 and layer == "backend":
+                reset_tasks = [
+                    asyncio.create_task(
+                        asyncio.to_thread(self.__database_sandbox.reset)
+                        if self.__database_sandbox is not None
+                        else asyncio.to_thread(DatabaseSandbox, self.title)
+                    )
+                ]
 
+            fallback_query = None
             if turn == 0:
-                prev_docs = "".join(
-                    [
-                        f"Here is the documentation for the {layer}: {doc}\n"
-                        for layer, doc in docs.items()
-                    ]
-                )
+                prev_docs = describe_contracts(contracts or {}, docs)
                 dev_query = developer_kickoff.format(
                     language=developer.languages,
                     requirements=requirements,
                     prev_docs=prev_docs,
                 )
             else:
-                dev_query = developer_followup.format(
-                    feedback=tester_message, language=developer.languages
-                )
-
-            # Send query to dev agent
-            self.__transmit_animation_signal(f"{developer.name} is typing")
-            dev_code = developer.answer(dev_query)
-            dev_code = parse_message(dev_code, developer.parser)
-            self.__transmit_message_signal(sender=developer.name, message=dev_code)
-
-            # Execute code in docker container
-            log_string = ""
-            if layer != "database":
-                self.__transmit_animation_signal(f"Running code in {layer} container")
-                dependencies = (
-                    ["FastAPI", "uvicorn", "asyncpg", "pydantic", "pandas", "numpy"]
-                    if layer == "backend"
-                    else None
-                )
-                timestamp_execution = int(
-                    time.mktime(datetime.datetime.now().timetuple())
-                )
-                docker_container = docker_sandbox.trigger_execution_pipeline(
-                    dev_code, dependencies
-                )
+                # Returning the previous code again is pointed out explicitly
+                dev_query = (
+                    developer_unchanged
+                    if previous is not None and previous["unchanged"]
+                    else developer_followup
+                ).format(feedback=tester_message, language=developer.languages)
+                # After a parse failure the feedback asks for the whole code snippet, not for a diff
+                if (
+                    developer_diff_followup is not None
+                    and previous is not None
+                    and not previous["unchanged"]
+                    and not parse_failed
+                ):
+                    fallback_query = dev_query
+                    dev_query = developer_diff_followup.format(
+                        feedback=tester_message,
+                        fence=developer.parser["fields"][0],
+                        code=previous["code"],
+                    )
 
-                docker_logs = docker_container.logs(
-                    since=timestamp_execution, tail=10
-                ).decode("utf-8")
-                print(f"\033[38;5;208m{'Docker logs: '}\033[0m", docker_logs)
-                log_string = f"These are the last few log statements that one gets when running the code in a dedicated docker container:\n{docker_logs}"
-
-            # Send message, code and docker logs to tester agent
-            # if layer is frontend, the tester need the documentation of the backend to check if the dev created one element for each api endpoint
-            backend_docs = (
-                f"This is the documentation for the backend: {docs['backend']}"
-                if layer == "frontend"
-                else ""
+            diff_review = (
+                previous is not None
+                and previous["reviewed"]
+                and reviews_since_full_code is not None
+                and reviews_since_full_code < tester.memory_window
             )
 
-            tester_query = tester_followup.format(
-                code=dev_code, docker_logs=log_string, backend_docs=backend_docs
+            # Send query to dev agent. With more than one candidate, the candidates are written, executed and
+            # tested concurrently and the first accepted one is kept
+            self.__transmit_animation_signal(f"{developer.name} is typing")
+            transmit = self.candidates == 1  # Concurrent candidates are not shown in the chat until one is kept
+            finished = await self.__race_candidates(
+                [
+                    self.__try_candidate(
+                        layer,
+                        index,
+                        developer,
+                        tester,
+                        candidate_sandboxes[index],
+                        dev_query,
+                        reset_tasks[index],
+                        backend_docs,
+                        transmit,
+                        previous,
+                        fallback_query,
+                        diff_review,
+                    )
+                    for index in range(self.candidates)
+                ]
+            )
+            # The database resets of cancelled candidates keep running in their threads. The next turn resets the
+            # same databases, so it has to wait for them
+            await asyncio.gather(
+                *[task for task in reset_tasks if task is not None],
+                return_exceptions=True,
+            )
+            candidate = self.__select_candidate(finished)
+            developer.remember(candidate["dev_query"], candidate["dev_answer"])
+
+            # Counted for the kept candidate only, so that the metrics do not depend on the number of candidates
+            if candidate.get("unchanged"):
+                self.__metrics["unchanged_turns"][layer] += 1
+            if candidate.get("precheck_failed"):
+                self.__metrics["precheck_failures"][layer] += 1
+            if candidate.get("precheck_warnings"):
+                self.__metrics["precheck_warnings"][layer] += 1
+
+            parse_failed = candidate["dev_code"] is None
+            if parse_failed:
+                # The answer did not contain the requested code snippet. Let a stronger model try again
+                self.__escalate(developer, layer, turn, "parse_failure")
+                tester_message = f'Your answer could not be used, because it did not contain a markdown code snippet starting with "```{developer.parser["fields"][0]}" and ending with "```".'
+                self.__add_metrics(f"turns_{layer}", turn + 1)
+                continue
+
+            if candidate["tester_query"] is not None:  # Otherwise the pre-check rejected the code
+                tester.remember(candidate["tester_query"], candidate["tester_answer"])
+                reviews_since_full_code = 0 if not diff_review else reviews_since_full_code + 1
+            dev_code, accepted, tester_message = (
+                candidate["dev_code"],
+                candidate["accepted"],
+                candidate["tester_message"],
+            )
+            previous = {
+                "code": dev_code,
+                "hash": code_hash(dev_code, layer),
+                "tester_message": tester_message,
+                "unchanged": candidate.get("unchanged", False),
+                "reviewed": candidate["tester_query"] is not None,
+            }
+            if not transmit:
+                self.__transmit_message_signal(sender=developer.name, message=dev_code)
+            self.__transmit_message_signal(
+                sender=tester.name,
+                message=(
+                    "The code did not change since the last turn, so it was not run and tested again."
+                    if previous["unchanged"]
+                    else tester_message
+                ),
             )
-            self.__transmit_animation_signal(f"{tester.name} is typing")
-            # Vision takes up about 5100 tokens. Current limit is 10_000 tokens per minute, so we can use it just once.
-            # use_vision = True if layer == "frontend" and turn == 0 else False
-            use_vision = False
-            tester_message = tester.answer(tester_query, use_vision=use_vision)
-            tester_dict = parse_message(tester_message, tester.parser)
-
-            # Handle error that results from testers not providing a text field in their response
-            if tester_dict.get("text") is None:
-                accepted, tester_message = (
-                    True,
-                    "The code ran without any errors and fulfills all requirements",
-                )
-            else:
-                accepted, tester_message = tester_dict.values()
-
-            self.__transmit_message_signal(sender=tester.name, message=tester_message)
 
             # Overwrite the turn metric with the new value
             self.__add_metrics(f"turns_{layer}", turn + 1)
+            self.__metrics["accepted_candidate"][layer] = candidate["index"]
 
             if accepted:
                 break
 
+            # Escalate the developer to a stronger model after every escalate_after rejections or as soon as the
+            # code or the complaints of the tester stop changing. If there is no stronger model, the loop is aborted
+            rejections += 1
+            stuck = progress.update(dev_code, tester_message)
+            reason = (
+                "rejections"
+                if developer.escalate_after and rejections % developer.escalate_after == 0
+                else stuck
+            )
+            if reason is not None and self.__escalate(developer, layer, turn, reason):
+                progress.reset()
+            elif stuck is not None:
+                self.__metrics["early_aborts"].append(
+                    {"layer": layer, "turn": turn + 1, "reason": stuck}
+                )
+                break
+
+        # The kept code still has to be deployed if it ran in a candidate sandbox or its result came from the cache
+        if (
+            layer != "database"
+            and dev_code
+            and self.__deployed_code.get(docker_sandbox.container_name) != dev_code
+        ):
+            await self.__execute_in_sandbox(
+                layer, docker_sandbox, dev_code, use_cache=False
+            )
+
+        # The contract of the layer is derived while the documenter is writing
+        contract_task = None
+        if layer == "database" and dev_code:
+            contract_task = asyncio.create_task(
+                asyncio.to_thread(database_contract, dev_code)
+            )
+        elif layer == "backend" and dev_code:
+            contract_task = asyncio.create_task(backend_contract(docker_sandbox.url))
+
         # 1c. Documenter creates documentation
         self.__transmit_animation_signal(f"{documenter.name} is typing")
         documentation_task = documenter.get_prompt_text("document")
@@ -310,10 +860,18 @@ class Pipeline(QObject):
         documentation_task = documentation_task.format(
             requirements=requirements[layer], kind=layer, code=dev_code
         )
-        documentation = documenter.answer(documentation_task)
+        documentation = await documenter.aanswer(
+            documentation_task, on_token=self.__token_callback(documenter)
+        )
         self.__transmit_message_signal(sender=documenter.name, message=documentation)
 
         # Add documentation to orchestrators memory / chat history
         self.orchestrator.inject_message(str(documentation), kind="human")
 
-        return (dev_code, documentation)
+        contract = await contract_task if contract_task is not None else None
+        self.__metrics["contract_chars"][layer] = {
+            "contract": len(contract) if contract is not None else None,
+            "docs": len(documentation),
+        }
+
+        return (dev_code, documentation, contract)
@@ -0,0 +1,380 @@
+import re
+import ast
+
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+from src.sandbox.images import PYTHON_STDLIB_MODULES
+
+
+# Third-party packages that the backend developers may use (see src/characters/backend_dev.txt)
+BACKEND_PACKAGES = {"fastapi", "uvicorn", "asyncpg", "pydantic", "pandas", "numpy"}
+# Installed as dependencies of the packages above
+IMPLICIT_PACKAGES = {
+    "starlette",
+    "anyio",
+    "sniffio",
+    "idna",
+    "h11",
+    "click",
+    "typing_extensions",
+    "annotated_types",
+    "pydantic_core",
+    "dateutil",
+    "pytz",
+    "tzdata",
+    "six",
+}
+
+# Keywords that a PostgreSQL statement usually starts with. Other statements are only reported to the tester
+SQL_KEYWORDS = {
+    "abort",
+    "alter",
+    "analyze",
+    "begin",
+    "call",
+    "checkpoint",
+    "close",
+    "cluster",
+    "comment",
+    "commit",
+    "copy",
+    "create",
+    "deallocate",
+    "declare",
+    "delete",
+    "discard",
+    "do",
+    "drop",
+    "end",
+    "execute",
+    "explain",
+    "fetch",
+    "grant",
+    "insert",
+    "listen",
+    "lock",
+    "merge",
+    "move",
+    "notify",
+    "prepare",
+    "reassign",
+    "refresh",
+    "reindex",
+    "release",
+    "reset",
+    "revoke",
+    "rollback",
+    "savepoint",
+    "security",
+    "select",
+    "set",
+    "show",
+    "start",
+    "table",
+    "truncate",
+    "unlisten",
+    "update",
+    "vacuum",
+    "values",
+    "with",
+}
+
+# Elements without closing tag and elements whose closing tag may be omitted in HTML5
+VOID_ELEMENTS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "link",
+    "meta",
+    "source",
+    "track",
+    "wbr",
+}
+OPTIONAL_END_ELEMENTS = {
+    "html",
+    "head",
+    "body",
+    "p",
+    "li",
+    "dt",
+    "dd",
+    "option",
+    "optgroup",
+    "tr",
+    "td",
+    "th",
+    "thead",
+    "tbody",
+    "tfoot",
+    "colgroup",
+    "caption",
+    "rt",
+    "rp",
+}
+
+MAX_PROBLEMS = 5  # More problems than this would only bloat the followup prompt
+
+
+def check_backend(code: str) -> Tuple[List[str], List[str]]:
+    """
+    Compiles the backend code and checks that every import can be resolved inside the container. Only syntax errors
+    are errors, an import that can not be resolved might still be installed and is only a warning.
+
+    Args:
+        code (str): The Python code of the backend developer.
+
+    Returns:
+        Tuple[List[str], List[str]]: The errors and the warnings found. No errors if the code passed.
+    """
+    try:
+        tree = ast.parse(code, "main.py")
+        # Compiling the tree also finds errors that the parser accepts, e.g. "return" outside of a function
+        compile(tree, "main.py", "exec", dont_inherit=True)
+    except SyntaxError as e:
+        line = (e.text or "").strip()
+        return [
+            f"SyntaxError in line {e.lineno}: {e.msg}" + (f" ({line})" if line else "")
+        ], []
+
+    # Imports that are guarded by "except ImportError" are optional
+    optional_imports = {
+        id(child)
+        for node in ast.walk(tree)
+        if isinstance(node, ast.Try)
+        and any(
+            isinstance(handler.type, ast.Name)
+            and handler.type.id in ("ImportError", "ModuleNotFoundError")
+            for handler in node.handlers
+        )
+        for statement in node.body
+        for child in ast.walk(statement)
+    }
+
+    warnings = []
+    for node in ast.walk(tree):
+        if id(node) in optional_imports:
+            continue
+        if isinstance(node, ast.Import):
+            modules = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules = [node.module]
+        else:
+            continue
+
+        for module in modules:
+            package = module.split(".")[0]
+            if (
+                package not in PYTHON_STDLIB_MODULES
+                and package not in BACKEND_PACKAGES | IMPLICIT_PACKAGES
+            ):
+                warnings.append(
+                    f"The import of '{module}' in line {node.lineno} might not be resolvable. Only the python "
+                    f"standard library and {', '.join(sorted(BACKEND_PACKAGES))} are installed"
+                )
+
+    return [], warnings[:MAX_PROBLEMS]
+
+
+def _closing_quote(code: str, start: int, closing: str) -> int:
+    """Returns the index of the quote that closes the string at start or -1. E-strings can escape quotes with '\\'"""
+    escaped = (
+        closing == "'"
+        and start > 0
+        and code[start - 1] in "eE"
+        and (start == 1 or not (code[start - 2].isalnum() or code[start - 2] in "_$"))
+    )
+    i = start + 1
+    while i < len(code):
+        if escaped and code[i] == "\\":
+            i += 2
+            continue
+        if code[i] == closing:
+            return i
+        i += 1
+    return -1
+
+
+def check_database(code: str) -> Tuple[List[str], List[str]]:
+    """
+    Lexes the SQL statements and checks that quotes, comments and parentheses are balanced. The dialect
+    (PostgreSQL) is left to the tester, so a statement that does not start with a known keyword is only a warning.
+
+    Args:
+        code (str): The SQL code of the database developer.
+
+    Returns:
+        Tuple[List[str], List[str]]: The errors and the warnings found. No errors if the code passed.
+    """
+    problems, warnings = [], []
+    statements = [[1, ""]]  # Line and text (without comments and strings) of every statement
+    depth, line, open_lines = 0, 1, []
+    i = 0
+    while i < len(code):
+        char = code[i]
+        if code.startswith("--", i):
+            end = code.find("\n", i)
+            i = len(code) if end == -1 else end
+            continue
+
+        # Block comments, strings, quoted identifiers and PostgreSQL dollar quoting
+        closing = None
+        if code.startswith("/*", i):
+            closing = "*/"
+        elif char in ("'", '"'):
+            closing = char
+        elif char == "$" and (dollar_quote := re.match(r"\$\w*\$", code[i : i + 64])):
+            closing = dollar_quote.group(0)
+
+        if closing is not None:
+            if closing in ("'", '"'):
+                end = _closing_quote(code, i, closing)
+            else:
+                opening_length = 2 if closing == "*/" else len(closing)
+                end = code.find(closing, i + opening_length)
+            if end == -1:
+                problems.append(f"The quote or comment in line {line} is never closed")
+                break
+            line += code.count("\n", i, end)
+            statements[-1][1] += " " if closing == "*/" else "x"
+            i = end + len(closing)
+            continue
+
+        if char == "\n":
+            line += 1
+        elif char == "(":
+            depth += 1
+            open_lines.append(line)
+        elif char == ")":
+            if depth == 0:
+                problems.append(
+                    f"The closing parenthesis in line {line} has no opening parenthesis"
+                )
+            else:
+                depth -= 1
+                open_lines.pop()
+        elif char == ";":
+            if depth > 0:
+                problems.append(
+                    f"The statement ends in line {line}, but the parenthesis opened in line {open_lines[-1]} is not closed"
+                )
+                depth, open_lines = 0, []
+            statements.append([line, ""])
+            i += 1
+            continue
+
+        if statements[-1][1].strip() == "" and char.strip():
+            statements[-1][0] = line  # The statement starts with its first word
+        statements[-1][1] += char
+        i += 1
+
+    if not problems and depth > 0:
+        problems.append(f"The parenthesis opened in line {open_lines[-1]} is never closed")
+
+    statements = [(line, text) for line, text in statements if text.strip()]
+    if not statements and not problems:
+        warnings.append("The code does not contain any SQL statements")
+    for line, text in statements:
+        first_word = text.split()[0].lower()
+        if first_word not in SQL_KEYWORDS:
+            warnings.append(
+                f"The statement in line {line} starts with '{text.split()[0]}', which is not a common SQL keyword"
+            )
+
+    return problems[:MAX_PROBLEMS], warnings[:MAX_PROBLEMS]
+
+
+class _TagBalanceParser(HTMLParser):
+    """Collects elements that are closed without being opened or that are never closed"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.problems: List[str] = []
+        self.__open_elements: list = []  # Stack of (tag, line)
+
+    def handle_starttag(self, tag: str, attrs: list) -> None:
+        if tag not in VOID_ELEMENTS:
+            self.__open_elements.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag: str, attrs: list) -> None:
+        pass  # Self-closing, e.g. <br/>
+
+    def handle_endtag(self, tag: str) -> None:
+        line = self.getpos()[0]
+        if tag in VOID_ELEMENTS:
+            return
+        if tag not in (open_tag for open_tag, _ in self.__open_elements):
+            self.problems.append(
+                f"The closing tag </{tag}> in line {line} has no opening tag"
+            )
+            return
+
+        # Everything opened after the element is closed implicitly
+        while (element := self.__open_elements.pop())[0] != tag:
+            if element[0] not in OPTIONAL_END_ELEMENTS:
+                self.problems.append(
+                    f"The element <{element[0]}> opened in line {element[1]} is not closed before </{tag}> in line {line}"
+                )
+
+    def close(self) -> None:
+        super().close()
+        for tag, line in self.__open_elements:
+            if tag not in OPTIONAL_END_ELEMENTS:
+                self.problems.append(
+                    f"The element <{tag}> opened in line {line} is never closed"
+                )
+
+
+def check_frontend(code: str) -> Tuple[List[str], List[str]]:
+    """
+    Parses the HTML and checks that the elements are properly nested and closed. Browsers render unclosed and
+    mis-nested elements anyway, so these findings are only warnings.
+
+    Args:
+        code (str): The HTML code of the frontend developer.
+
+    Returns:
+        Tuple[List[str], List[str]]: The errors and the warnings found. HTML never has errors.
+    """
+    parser = _TagBalanceParser()
+    parser.feed(code)
+    parser.close()
+
+    return [], parser.problems[:MAX_PROBLEMS]
+
+
+PRECHECKS = {
+    "database": check_database,
+    "backend": check_backend,
+    "frontend": check_frontend,
+}
+
+
+def _join(problems: List[str]) -> str:
+    return " ".join(problem if problem.endswith(".") else problem + "." for problem in problems)
+
+
+def run_precheck(layer: str, code: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Runs the static pre-check of a layer. It takes milliseconds, so code that could never pass is sent back to the
+    developer without a Docker build and a tester call. Code is only rejected for errors, warnings go to the tester.
+
+    Args:
+        layer (str): The layer of the code ("database", "backend" or "frontend").
+        code (str): The code of the developer.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: The feedback for the developer or None if the code passed and the
+            warnings for the tester or None if there are none.
+    """
+    errors, warnings = PRECHECKS[layer](code)
+    if errors:
+        return "The code was rejected by a static check before it was run: " + _join(errors), None
+    if warnings:
+        return None, "A static check found possible problems, verify them: " + _join(warnings)
+    return None, None
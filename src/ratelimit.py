@@ -0,0 +1,132 @@
+import json
+import time
+import asyncio
+import threading
+
+from pathlib import Path
+from functools import lru_cache
+from typing import Optional
+
+
+class RateLimiter:
+    """
+    A client-side token bucket for requests per minute and tokens per minute.
+
+    Both buckets start full and refill continuously. A call may only proceed if both buckets can
+    serve it, so the throughput saturates the quota without exceeding it.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int) -> None:
+        """
+        Args:
+            requests_per_minute (int): The maximum number of requests per minute.
+            tokens_per_minute (int): The maximum number of (prompt + completion) tokens per minute.
+        """
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+
+        self.__lock = threading.Lock()
+        self.__requests = float(requests_per_minute)
+        self.__tokens = float(tokens_per_minute)
+        self.__last_refill = time.monotonic()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        elapsed_minutes = (now - self.__last_refill) / 60
+        self.__last_refill = now
+
+        self.__requests = min(
+            self.requests_per_minute,
+            self.__requests + elapsed_minutes * self.requests_per_minute,
+        )
+        self.__tokens = min(
+            self.tokens_per_minute,
+            self.__tokens + elapsed_minutes * self.tokens_per_minute,
+        )
+
+    def __try_acquire(self, tokens: int) -> float:
+        """Takes from both buckets if possible. Returns 0 on success or else the seconds to wait"""
+        # A single call may never need more than the whole bucket, otherwise it would wait forever
+        tokens = min(tokens, self.tokens_per_minute)
+
+        with self.__lock:
+            self.__refill()
+            missing_requests = max(0.0, 1 - self.__requests)
+            missing_tokens = max(0.0, tokens - self.__tokens)
+
+            if missing_requests == 0 and missing_tokens == 0:
+                self.__requests -= 1
+                self.__tokens -= tokens
+                return 0.0
+
+        return 60 * max(
+            missing_requests / self.requests_per_minute,
+            missing_tokens / self.tokens_per_minute,
+        )
+
+    def acquire(self, tokens: int) -> None:
+        """Blocks until one request with the estimated number of tokens may be sent"""
+        while (wait := self.__try_acquire(tokens)) > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, tokens: int) -> None:
+        """Same as acquire, but waits without blocking the event loop"""
+        while (wait := self.__try_acquire(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        """Corrects the token bucket once the real usage of a call is known"""
+        with self.__lock:
+            self.__refill()
+            self.__tokens = min(
+                self.tokens_per_minute,
+                self.__tokens + estimated_tokens - actual_tokens,
+            )
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def load_rate_limits(path: Path) -> dict:
+    """Reads the limits per model (src/setup/rate_limits.json) only once per process. No file means no limits"""
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def get_rate_limiter(model: str, config: Optional[dict]) -> Optional[RateLimiter]:
+    """
+    Returns the process-wide rate limiter of a model. All agents (and pipelines) using the same model share it.
+
+    Args:
+        model (str): The name of the model.
+        config (Optional[dict]): The limits of the model from src/setup/rate_limits.json.
+
+    Returns:
+        Optional[RateLimiter]: The rate limiter or None if no limit is configured.
+    """
+    if not config:
+        return None
+
+    with _rate_limiters_lock:
+        if model not in _rate_limiters:
+            _rate_limiters[model] = RateLimiter(
+                requests_per_minute=config["requests_per_minute"],
+                tokens_per_minute=config["tokens_per_minute"],
+            )
+        rate_limiter = _rate_limiters[model]
+
+    # Whichever agent is created first would otherwise decide silently
+    if (rate_limiter.requests_per_minute, rate_limiter.tokens_per_minute) != (
+        config["requests_per_minute"],
+        config["tokens_per_minute"],
+    ):
+        raise ValueError(
+            f"Conflicting rate limits for {model}: {config} and {rate_limiter.requests_per_minute} requests, "
+            f"{rate_limiter.tokens_per_minute} tokens per minute"
+        )
+    return rate_limiter
@@ -0,0 +1,94 @@
+import random
+import asyncio
+import threading
+
+from collections import deque
+from typing import Optional, Union
+
+import openai
+
+
+# Errors that are worth another attempt. Everything else (e.g. invalid requests) is raised immediately
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # Includes openai.APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.ConflictError,
+    asyncio.TimeoutError,
+    TimeoutError,
+)
+
+DEFAULT_RETRY_CONFIG = {
+    "max_retries": 3,
+    "base_delay": 1.0,
+    "max_delay": 30.0,
+    "timeout": 120,
+    "hedge_after": None,
+}
+
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Returns the seconds to wait before the next attempt using exponential backoff with full jitter.
+
+    Args:
+        attempt (int): The number of the failed attempt, starting at 0.
+        base_delay (float): The delay cap of the first retry.
+        max_delay (float): The upper bound of every delay.
+
+    Returns:
+        float: A random delay between 0 and min(max_delay, base_delay * 2 ** attempt).
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+class LatencyTracker:
+    """Keeps the latencies of the most recent successful calls of a model"""
+
+    def __init__(self, window: int = 100, min_samples: int = 10) -> None:
+        self.min_samples = min_samples
+        self.__latencies = deque(maxlen=window)
+        self.__lock = threading.Lock()
+
+    def add(self, latency: float) -> None:
+        with self.__lock:
+            self.__latencies.append(latency)
+
+    def percentile(self, quantile: float) -> Optional[float]:
+        """Returns the latency at the given quantile or None if there are not enough samples yet"""
+        with self.__lock:
+            latencies = sorted(self.__latencies)
+
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+
+_latency_trackers = {}
+_latency_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(model: str) -> LatencyTracker:
+    """Returns the process-wide latency tracker of a model"""
+    with _latency_trackers_lock:
+        return _latency_trackers.setdefault(model, LatencyTracker())
+
+
+def hedge_delay(
+    hedge_after: Union[None, float, str], tracker: LatencyTracker
+) -> Optional[float]:
+    """
+    Resolves the "hedge_after" setting of agents.json.
+
+    Args:
+        hedge_after (Union[None, float, str]): Seconds, a percentile like "p95" or None to disable hedging.
+        tracker (LatencyTracker): The latency tracker of the model.
+
+    Returns:
+        Optional[float]: The seconds after which a duplicate request is sent or None.
+    """
+    if hedge_after is None:
+        return None
+    if isinstance(hedge_after, str):
+        return tracker.percentile(int(hedge_after.lstrip("p")) / 100)
+    return float(hedge_after)
@@ -3,11 +3,15 @@ import subprocess
 import docker
 import os
 import re
+import hashlib
 import tempfile
 from typing import Any, Set, Tuple
 import logging
 
 
+IMAGE_LABEL = "agentcy.content"  # Marks the content-addressed images, see src/sandbox/garbage.py
+
+
 def extract_port_from_string(script: str) -> str:
     """
     Extracts the port number from a script string.
@@ -50,12 +54,14 @@ def execute_code(
     dockerfile_method: callable,
     dependencies: Set[str],
     port: str,
+    host_port: str = None,
 ) -> str:
     """
     Executes a script in a Docker container.
 
     Args:
         input_data (str): The script as a string or a path to the script file.
+        host_port (str, optional): The port on the host the container port is published to. Defaults to the container port.
 
     Returns:
         str: The Docker container_id string.
@@ -75,8 +81,8 @@ def execute_code(
 
         logging.info(f"Parsing file: {script_name}.")
 
-        # Remove existing container if exists
-        remove_existing_container_and_image(client, container_name, image_tag)
+        # Remove existing container if exists. Images are kept, so that unchanged builds are reused
+        remove_existing_container(client, container_name)
 
         # Build and run the Docker image
         container_id = build_and_run_container(
@@ -85,6 +91,7 @@ def execute_code(
             container_name=container_name,
             image_tag=image_tag,
             port=port,
+            host_port=host_port,
         )
 
         logging.info(f"Container {container_id} started successfully.")
@@ -148,39 +155,53 @@ def write_file(file_path: str, content: str) -> None:
         file.write(content)
 
 
-def remove_existing_container_and_image(
-    client: docker.DockerClient, container_name: str, image_tag: str
-) -> None:
+def remove_existing_container(client: docker.DockerClient, container_name: str) -> None:
     """
-    Removes an existing Docker container by its name and the associated image by its tag.
+    Removes an existing Docker container by its name. Its image is kept, the garbage collector removes unused images.
 
     Args:
         client (docker.DockerClient): The Docker client instance.
         container_name (str): The name of the container to remove.
-        image_tag (str): The tag of the image to remove.
     """
     try:
-        # Try to get the container by name and remove it
-        try:
-            container = client.containers.get(container_name)
-            logging.info(f"Removing container: {container_name}")
-            container.stop()
-            container.remove()
-        except docker.errors.NotFound:
-            logging.info(f"No container found with name: {container_name}")
-
-        # Remove the image associated with the given tag
-        try:
-            image = client.images.get(image_tag)
-            logging.info(f"Removing image: {image_tag}")
-            client.images.remove(image.id)
-        except docker.errors.ImageNotFound:
-            logging.info(f"No image found with tag: {image_tag}")
-        except docker.errors.APIError as e:
-            logging.error(f"Error removing image with tag {image_tag}: {str(e)}")
-
+        container = client.containers.get(container_name)
+        logging.info(f"Removing container: {container_name}")
+        container.stop()
+        container.remove()
+    except docker.errors.NotFound:
+        logging.info(f"No container found with name: {container_name}")
     except Exception as e:
-        logging.error(f"General error in removing container or image: {str(e)}")
+        logging.error(f"General error in removing container: {str(e)}")
+
+
+def content_image_tag(
+    image_tag: str, workspace_folder: str, dockerfile_bytes: BytesIO
+) -> str:
+    """
+    Returns a tag that identifies the content of an image: the Dockerfile and every file of the build context.
+
+    Args:
+        image_tag (str): The tag of the sandbox, its repository is kept (e.g. python_webserver:latest).
+        workspace_folder (str): The workspace folder path, i.e. the build context.
+        dockerfile_bytes (BytesIO): The Dockerfile as a BytesIO object.
+
+    Returns:
+        str: The repository of the image tag with the hash of the content as tag.
+    """
+    digest = hashlib.sha256(dockerfile_bytes.getvalue())
+    for folder, subfolders, files in os.walk(workspace_folder):
+        subfolders.sort()  # os.walk visits the subfolders in this order
+        for file_name in sorted(files):
+            path = os.path.join(folder, file_name)
+            relative_path = os.path.relpath(path, workspace_folder)
+            if relative_path == "Dockerfile":
+                continue  # Part of the digest already
+            digest.update(relative_path.encode("utf-8") + b"\0")
+            with open(path, "rb") as file:
+                digest.update(hashlib.sha256(file.read()).digest())
+
+    repository = image_tag.rsplit(":", 1)[0]
+    return f"{repository}:{digest.hexdigest()[:16]}"
 
 
 def build_and_run_container(
@@ -190,6 +211,7 @@ def build_and_run_container(
     port: str,
     network_name: str = "Agentcy",
     container_name: str = None,
+    host_port: str = None,
 ):
     """
     Builds and runs a Docker container on a specified network.
@@ -201,6 +223,7 @@ def build_and_run_container(
         port (str): The port number to expose.
         network_name (str): The name of the Docker network to use.
         container_name (str, optional): The name of the Docker container. Defaults to None.
+        host_port (str, optional): The port on the host the container port is published to. Defaults to port.
 
     Returns:
         The container ID on success, None on failure.
@@ -217,10 +240,31 @@ def build_and_run_container(
         if network_name not in networks:
             subprocess.run(["docker", "network", "create", network_name], check=True)
 
-        # Build the image
-        subprocess.run(
-            ["docker", "build", "-t", image_tag, workspace_folder], check=True
+        # Build the image, unless an image with the same content exists already. The image tag of the sandbox points
+        # to the latest build
+        content_tag = content_image_tag(image_tag, workspace_folder, dockerfile_bytes)
+        image_exists = (
+            subprocess.run(
+                ["docker", "image", "inspect", content_tag], capture_output=True
+            ).returncode
+            == 0
         )
+        if image_exists:
+            logging.info(f"Reusing image: {content_tag}")
+        else:
+            subprocess.run(
+                [
+                    "docker",
+                    "build",
+                    "-t",
+                    content_tag,
+                    "--label",
+                    f"{IMAGE_LABEL}={image_tag}",
+                    workspace_folder,
+                ],
+                check=True,
+            )
+        subprocess.run(["docker", "tag", content_tag, image_tag], check=True)
 
         # Run the container
         run_command = [
@@ -230,14 +274,14 @@ def build_and_run_container(
             "--name",
             container_name or "",
             "-p",
-            f"{port}:{port}",
+            f"{host_port or port}:{port}",
             "-v",
             f"{os.path.abspath(workspace_folder)}:/usr/share/nginx/html/",
             "-w",
             "/usr/share/nginx/html/",
             "--network",
             network_name,
-            image_tag,
+            content_tag,
         ]
         container_id = subprocess.check_output(run_command).decode().strip()
 
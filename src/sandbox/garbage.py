@@ -0,0 +1,100 @@
+import time
+import logging
+import calendar
+import argparse
+
+from typing import List
+
+import docker
+
+from src.sandbox.images import BASE_IMAGE_LABEL
+from src.sandbox.dockergenerator import IMAGE_LABEL
+
+
+def unique_sizes(client: docker.DockerClient) -> dict:
+    """
+    Returns the bytes that removing an image would free, i.e. without the layers it shares with other images. The size
+    that Docker reports for an image includes its parent layers, so images built on the same base would count the
+    base again and again.
+    """
+    sizes = {}
+    for image in client.df().get("Images") or []:
+        shared = image.get("SharedSize", -1)  # -1 if Docker did not compute it
+        sizes[image["Id"]] = image["Size"] - max(shared, 0)
+    return sizes
+
+
+def collect_images(
+    max_total_gb: float = 20, max_age_days: float = 14, dry_run: bool = False
+) -> List[str]:
+    """
+    Removes the images built by the sandboxes (content-addressed builds and base images) that are older than the
+    maximum age or, oldest first, until their total unique size is within the limit. Images used by a container or by
+    another image and images with tags of other sandboxes or projects are never removed.
+
+    Args:
+        max_total_gb (float): The maximum total size of the images in gigabytes.
+        max_age_days (float): The maximum age of an image in days.
+        dry_run (bool): Only return the images that would be removed.
+
+    Returns:
+        List[str]: The tags (or IDs) of the removed images.
+    """
+    client = docker.from_env()
+    try:
+        images = {
+            image.id: image
+            for label in (IMAGE_LABEL, BASE_IMAGE_LABEL)
+            for image in client.images.list(filters={"label": label})
+        }
+        used_images = {
+            container.attrs["Image"] for container in client.containers.list(all=True)
+        }
+
+        # Oldest first. Docker does not track when an image was used last, so the creation time has to do
+        candidates = sorted(images.values(), key=lambda image: image.attrs["Created"])
+        sizes = unique_sizes(client)
+        size = lambda image: sizes.get(image.id, image.attrs["Size"])
+        total_size = sum(size(image) for image in candidates)
+        max_age = max_age_days * 24 * 3600
+        now = time.time()
+
+        removed = []
+        for image in candidates:
+            created = calendar.timegm(
+                time.strptime(image.attrs["Created"][:19], "%Y-%m-%dT%H:%M:%S")
+            )  # UTC
+            if total_size <= max_total_gb * 1e9 and now - created <= max_age:
+                continue
+            if image.id in used_images:
+                continue
+
+            name = image.tags[0] if image.tags else image.short_id
+            if not dry_run:
+                try:
+                    client.images.remove(image.id)
+                except docker.errors.APIError as e:
+                    # Still needed, e.g. a base image with images built on top of it or an image with several tags
+                    logging.info(f"Keeping image {name}: {e}")
+                    continue
+            logging.info(f"Removed image {name}")
+            removed.append(name)
+            total_size -= size(image)
+
+        return removed
+
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Removes old sandbox images that are not used by any container"
+    )
+    parser.add_argument("-s", "--max_total_gb", type=float, default=20)
+    parser.add_argument("-a", "--max_age_days", type=float, default=14)
+    parser.add_argument("-n", "--dry_run", action="store_true")
+    args = parser.parse_args()
+
+    for name in collect_images(args.max_total_gb, args.max_age_days, args.dry_run):
+        print(f"{'Would remove' if args.dry_run else 'Removed'} {name}")
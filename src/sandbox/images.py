@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import threading
+
+from io import BytesIO
+from typing import Iterable
+
+import docker
+
+
+# Packages that every backend gets (see src/characters/backend_dev.txt)
+BACKEND_DEPENDENCIES = ["FastAPI", "uvicorn", "asyncpg", "pydantic", "pandas", "numpy"]
+PYTHON_BASE_IMAGE = "python:3.9-slim"
+BASE_IMAGE_REPOSITORY = "agentcy_python_base"
+BASE_IMAGE_LABEL = "agentcy.base"  # Marks the images built here, e.g. for garbage collection
+# Top-level modules of the standard library of the Python in PYTHON_BASE_IMAGE. The host usually runs another
+# Python version, so sys.stdlib_module_names can not be used
+PYTHON_STDLIB_MODULES = frozenset(
+    {
+        "__future__", "_abc", "_aix_support", "_ast", "_asyncio", "_bisect", "_blake2", "_bootlocale",
+        "_bootsubprocess", "_bz2", "_codecs", "_codecs_cn", "_codecs_hk", "_codecs_iso2022", "_codecs_jp",
+        "_codecs_kr", "_codecs_tw", "_collections", "_collections_abc", "_compat_pickle", "_compression",
+        "_contextvars", "_crypt", "_csv", "_ctypes", "_curses", "_curses_panel", "_datetime", "_dbm", "_decimal",
+        "_elementtree", "_frozen_importlib", "_frozen_importlib_external", "_functools", "_gdbm", "_hashlib",
+        "_heapq", "_imp", "_io", "_json", "_locale", "_lsprof", "_lzma", "_markupbase", "_md5", "_msi",
+        "_multibytecodec", "_multiprocessing", "_opcode", "_operator", "_osx_support", "_overlapped", "_peg_parser",
+        "_pickle", "_posixshmem", "_posixsubprocess", "_py_abc", "_pydecimal", "_pyio", "_queue", "_random",
+        "_scproxy", "_sha1", "_sha256", "_sha3", "_sha512", "_signal", "_sitebuiltins", "_socket", "_sqlite3",
+        "_sre", "_ssl", "_stat", "_statistics", "_string", "_strptime", "_struct", "_symtable", "_thread",
+        "_threading_local", "_tkinter", "_tracemalloc", "_uuid", "_warnings", "_weakref", "_weakrefset", "_winapi",
+        "_zoneinfo", "abc", "aifc", "antigravity", "argparse", "array", "ast", "asynchat", "asyncio", "asyncore",
+        "atexit", "audioop", "base64", "bdb", "binascii", "binhex", "bisect", "builtins", "bz2", "cProfile",
+        "calendar", "cgi", "cgitb", "chunk", "cmath", "cmd", "code", "codecs", "codeop", "collections", "colorsys",
+        "compileall", "concurrent", "configparser", "contextlib", "contextvars", "copy", "copyreg", "crypt", "csv",
+        "ctypes", "curses", "dataclasses", "datetime", "dbm", "decimal", "difflib", "dis", "distutils", "doctest",
+        "email", "encodings", "ensurepip", "enum", "errno", "faulthandler", "fcntl", "filecmp", "fileinput",
+        "fnmatch", "formatter", "fractions", "ftplib", "functools", "gc", "genericpath", "getopt", "getpass",
+        "gettext", "glob", "graphlib", "grp", "gzip", "hashlib", "heapq", "hmac", "html", "http", "idlelib",
+        "imaplib", "imghdr", "imp", "importlib", "inspect", "io", "ipaddress", "itertools", "json", "keyword",
+        "lib2to3", "linecache", "locale", "logging", "lzma", "mailbox", "mailcap", "marshal", "math", "mimetypes",
+        "mmap", "modulefinder", "msilib", "msvcrt", "multiprocessing", "netrc", "nis", "nntplib", "nt", "ntpath",
+        "nturl2path", "numbers", "opcode", "operator", "optparse", "os", "ossaudiodev", "parser", "pathlib", "pdb",
+        "pickle", "pickletools", "pipes", "pkgutil", "platform", "plistlib", "poplib", "posix", "posixpath",
+        "pprint", "profile", "pstats", "pty", "pwd", "py_compile", "pyclbr", "pydoc", "pydoc_data", "pyexpat",
+        "queue", "quopri", "random", "re", "readline", "reprlib", "resource", "rlcompleter", "runpy", "sched",
+        "secrets", "select", "selectors", "shelve", "shlex", "shutil", "signal", "site", "smtpd", "smtplib",
+        "sndhdr", "socket", "socketserver", "spwd", "sqlite3", "sre_compile", "sre_constants", "sre_parse", "ssl",
+        "stat", "statistics", "string", "stringprep", "struct", "subprocess", "sunau", "symbol", "symtable", "sys",
+        "sysconfig", "syslog", "tabnanny", "tarfile", "telnetlib", "tempfile", "termios", "textwrap", "this",
+        "threading", "time", "timeit", "tkinter", "token", "tokenize", "trace", "traceback", "tracemalloc", "tty",
+        "turtle", "turtledemo", "types", "typing", "unicodedata", "unittest", "urllib", "uu", "uuid", "venv",
+        "warnings", "wave", "weakref", "webbrowser", "winreg", "winsound", "wsgiref", "xdrlib", "xml", "xmlrpc",
+        "zipapp", "zipfile", "zipimport", "zlib", "zoneinfo"
+    }
+)
+
+_build_locks = {}  # One lock per tag, so that concurrent candidates build an image only once
+_build_locks_lock = threading.Lock()
+
+
+def _normalize(dependencies: Iterable[str]) -> list:
+    return sorted({dependency.strip().lower() for dependency in dependencies if dependency.strip()})
+
+
+def base_image_tag(parent_image: str, dependencies: Iterable[str]) -> str:
+    """Returns the tag of the image that adds the dependencies to the parent image. It only depends on their content"""
+    digest = hashlib.sha256(
+        "\n".join([parent_image] + _normalize(dependencies)).encode("utf-8")
+    ).hexdigest()
+    return f"{BASE_IMAGE_REPOSITORY}:{digest[:16]}"
+
+
+def _build_lock(tag: str) -> threading.Lock:
+    with _build_locks_lock:
+        return _build_locks.setdefault(tag, threading.Lock())
+
+
+def ensure_image(parent_image: str, dependencies: Iterable[str]) -> str:
+    """
+    Returns an image with the dependencies installed on top of the parent image. The image is only built if there
+    is no image with the same parent and dependencies yet.
+
+    Args:
+        parent_image (str): The image to start from.
+        dependencies (Iterable[str]): The pip packages to install.
+
+    Returns:
+        str: The tag of the image.
+    """
+    dependencies = _normalize(dependencies)
+    if not dependencies:
+        return parent_image
+
+    tag = base_image_tag(parent_image, dependencies)
+    with _build_lock(tag):
+        client = docker.from_env()
+        try:
+            try:
+                client.images.get(tag)
+                return tag
+            except docker.errors.ImageNotFound:
+                pass
+
+            logging.info(f"Building {tag} with {', '.join(dependencies)}")
+            dockerfile_str = (
+                f"FROM {parent_image}\n"
+                f"RUN pip install --no-cache-dir wheel && pip install --no-cache-dir {' '.join(dependencies)}\n"
+            )
+            client.images.build(
+                fileobj=BytesIO(dockerfile_str.encode("utf-8")),
+                tag=tag,
+                rm=True,
+                labels={BASE_IMAGE_LABEL: parent_image},
+            )
+            return tag
+        finally:
+            client.close()
+
+
+def ensure_python_image(dependencies: Iterable[str]) -> str:
+    """
+    Returns the image a backend is built on. The standard dependencies are installed in a shared base image, further
+    dependencies are layered on top of it in an image of their own, so both are reused across turns and projects.
+
+    Args:
+        dependencies (Iterable[str]): The pip packages the backend needs.
+
+    Returns:
+        str: The tag of the image.
+    """
+    standard = _normalize(BACKEND_DEPENDENCIES)
+    # Dependencies that were extracted from the imports of the script can contain modules of the standard library
+    extras = [
+        dependency
+        for dependency in _normalize(dependencies)
+        if dependency not in standard and dependency not in PYTHON_STDLIB_MODULES
+    ]
+
+    base_tag = ensure_image(PYTHON_BASE_IMAGE, standard)
+    return ensure_image(base_tag, extras)
@@ -0,0 +1,109 @@
+import os
+import time
+import logging
+import threading
+
+from typing import Callable
+
+import httpx
+import docker
+
+
+# Seconds a sandbox may take until it is ready. Can be set in the .env file
+READY_TIMEOUT = float(os.getenv("AGENTCY_READY_TIMEOUT", 20))
+
+
+def http_probe(url: str) -> Callable[[], bool]:
+    """Returns a probe that succeeds once the server answers, whatever the status code (e.g. 404 for "/")"""
+
+    def probe() -> bool:
+        try:
+            # The port proxy of Docker accepts connections before the server listens, so a TCP connect is not enough
+            httpx.get(url, timeout=1)
+            return True
+        except httpx.HTTPError:
+            return False
+
+    return probe
+
+
+def postgres_probe(container, user: str) -> Callable[[], bool]:
+    """Returns a probe that succeeds once Postgres accepts connections"""
+
+    def probe() -> bool:
+        # Over TCP, because the temporary server of the init scripts only listens on the socket
+        try:
+            exit_code, _ = container.exec_run(["pg_isready", "-h", "127.0.0.1", "-U", user])
+        except docker.errors.APIError:
+            return False  # The container stopped in the meantime (409). Its "die" event ends the wait
+        return exit_code == 0
+
+    return probe
+
+
+def wait_until_ready(
+    container_id: str, probe: Callable[[], bool], timeout: float = READY_TIMEOUT
+) -> dict:
+    """
+    Waits until the probe succeeds. The events of the container are followed in the background, so a container that
+    dies is reported at once instead of after the timeout.
+
+    Args:
+        container_id (str): The ID of the container.
+        probe (Callable[[], bool]): Returns True once the container is ready.
+        timeout (float): Seconds until the wait is given up.
+
+    Returns:
+        dict: Whether the container is ready ("ready"), the reason ("ready", "exited" or "timeout") and the seconds
+            it took ("elapsed").
+    """
+    start_time = time.time()
+    died = threading.Event()
+    client = docker.from_env()
+    events = client.events(
+        decode=True,
+        filters={"container": container_id, "event": ["die", "oom", "destroy"]},
+    )
+
+    def follow_events() -> None:
+        try:
+            for _ in events:
+                died.set()
+                return
+        except Exception:
+            pass  # The stream is closed when the wait is over
+
+    threading.Thread(target=follow_events, name="container-events", daemon=True).start()
+
+    def result(reason: str) -> dict:
+        return {
+            "ready": reason == "ready",
+            "reason": reason,
+            "elapsed": round(time.time() - start_time, 3),
+        }
+
+    try:
+        # The container might have died before the event stream was opened
+        try:
+            container = client.containers.get(container_id)
+        except docker.errors.NotFound:
+            return result("exited")
+        if container.status in ("exited", "dead"):
+            return result("exited")
+
+        delay = 0.05
+        while time.time() - start_time < timeout:
+            if died.is_set():
+                return result("exited")
+            if probe():
+                return result("ready")
+            # Wakes up at once if the container dies
+            died.wait(min(delay, max(0, timeout - (time.time() - start_time))))
+            delay = min(delay * 2, 0.5)
+
+        logging.warning(f"Container {container_id[:12]} was not ready after {timeout} seconds")
+        return result("timeout")
+
+    finally:
+        events.close()
+        client.close()
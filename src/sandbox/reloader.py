@@ -0,0 +1,73 @@
+"""
+Runs a script inside the backend container and restarts it whenever the script changes. The workspace is bind-mounted
+into the container, so a new turn only has to overwrite the script instead of rebuilding the image.
+
+Usage: python reloader.py index.py
+
+Every start is announced with RELOAD_MARKER and the hash of the started script, every exit with EXIT_MARKER and the
+exit code, so that the sandbox can wait for them in the container logs. Only the standard library of the container's
+Python (3.9) may be used.
+"""
+import os
+import sys
+import time
+import signal
+import hashlib
+import subprocess
+
+RELOAD_MARKER = "[agentcy] started"
+EXIT_MARKER = "[agentcy] exited"
+POLL_INTERVAL = 0.2
+
+
+def script_hash(code: str) -> str:
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()[:16]
+
+
+def read_hash(path: str):
+    try:
+        with open(path, "r") as file:
+            return script_hash(file.read())
+    except OSError:
+        return None  # The file is being replaced
+
+
+def stop(process: subprocess.Popen) -> None:
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout=3)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def main(path: str) -> None:
+    current_hash, process, reported_exit = None, None, False
+
+    # As PID 1 of the container the reloader has to handle "docker stop" itself
+    def shutdown(signum, frame) -> None:
+        if process is not None:
+            stop(process)
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    while True:
+        new_hash = read_hash(path)
+        if new_hash is not None and new_hash != current_hash:
+            if process is not None:
+                stop(process)
+            current_hash, reported_exit = new_hash, False
+            print(f"{RELOAD_MARKER} {current_hash}", flush=True)
+            process = subprocess.Popen(
+                [sys.executable, path], env={**os.environ, "PYTHONUNBUFFERED": "1"}
+            )
+        elif process is not None and process.poll() is not None and not reported_exit:
+            # The script crashed or finished. It is started again once it changes
+            print(f"{EXIT_MARKER} {process.returncode}", flush=True)
+            reported_exit = True
+        time.sleep(POLL_INTERVAL)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
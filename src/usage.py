@@ -0,0 +1,104 @@
+from functools import lru_cache
+from typing import List, Optional
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.schema.output import LLMResult
+
+
+# USD per 1000 tokens as (prompt, completion)
+MODEL_PRICES = {
+    "gpt-3.5-turbo-1106": (0.001, 0.002),
+    "gpt-3.5-turbo-0125": (0.0005, 0.0015),
+    "gpt-4-1106-preview": (0.01, 0.03),
+    "gpt-4-0125-preview": (0.01, 0.03),
+    "gpt-4-vision-preview": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+}
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Collects the token usage that the API reports at the end of a (non-streamed) request"""
+
+    run_inline = True
+
+    def __init__(self) -> None:
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+
+    def on_llm_end(self, response: LLMResult, **kwargs) -> None:
+        token_usage = (response.llm_output or {}).get("token_usage") or {}
+        if token_usage:
+            self.prompt_tokens = token_usage.get("prompt_tokens")
+            self.completion_tokens = token_usage.get("completion_tokens")
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str):
+    import tiktoken
+
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str, model: str) -> int:
+    """
+    Counts the tokens of a text. Used when the API does not report the usage, e.g. for streamed answers.
+
+    Args:
+        text (str): The text to count the tokens of.
+        model (str): The model whose tokenizer should be used.
+
+    Returns:
+        int: The number of tokens. Falls back to a rough estimate if tiktoken is not available.
+    """
+    try:
+        return len(_get_encoding(model).encode(text, disallowed_special=()))
+    except Exception:
+        return len(text) // 4
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return round(
+        (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000, 6
+    )
+
+
+def summarize_calls(calls: List[dict], key: str) -> dict:
+    """
+    Aggregates the recorded LLM calls by the given key (e.g. "layer" or "agent").
+
+    Args:
+        calls (List[dict]): The call records created by Agent.
+        key (str): The field of the call records to group by.
+
+    Returns:
+        dict: Totals for every value of the key.
+    """
+    summary = {}
+    for call in calls:
+        totals = summary.setdefault(
+            call[key],
+            {
+                "calls": 0,
+                "cached": 0,
+                "retries": 0,
+                "hedged": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "latency": 0.0,
+                "cost": 0.0,
+            },
+        )
+        totals["calls"] += 1
+        totals["cached"] += int(call["cached"])
+        totals["retries"] += call["retries"]
+        totals["hedged"] += int(call["hedged"])
+        totals["prompt_tokens"] += call["prompt_tokens"]
+        totals["completion_tokens"] += call["completion_tokens"]
+        totals["latency"] = round(totals["latency"] + call["latency"], 3)
+        totals["cost"] = round(totals["cost"] + call["cost"], 6)
+
+    return summary
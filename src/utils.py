@@ -2,9 +2,11 @@ import re
 import json
 import time
 import base64
+import hashlib
 import tempfile
 
 from pathlib import Path
+from typing import Optional
 
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
@@ -55,23 +57,254 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode("utf-8")
 
 
-def parse_message(message: str, parser: dict):
-    if parser["use_parser"] == False:
-        return message
+def code_hash(code: str, layer: str) -> str:
+    """
+    Hashes the code without whitespace that does not change its meaning: trailing whitespace, blank lines and,
+    except for Python, indentation.
 
-    if parser["type"] == "code":
-        language = parser["fields"][0]
-        pattern = f"```{language}(.*?)```"
+    Args:
+        code (str): The code of a developer.
+        layer (str): The layer of the code ("database", "backend" or "frontend").
 
-    elif parser["type"] == "json":
-        pattern = r"```json\s*(.*?)```"
+    Returns:
+        str: The SHA-256 hex digest of the normalized code.
+    """
+    lines = (line.rstrip() for line in code.strip().splitlines())
+    if layer != "backend":
+        lines = (line.lstrip() for line in lines)
+    normalized = "\n".join(line for line in lines if line)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
 
-    regex_obj = re.search(pattern, message, re.DOTALL)
-    string_dict = regex_obj.group(1).strip()
 
-    result = string_dict
+class ParseError(ValueError):
+    """Raised if an answer does not contain what the parser of the agent is looking for"""
 
-    if parser["type"] == "json":
-        result = json.loads(string_dict)
 
-    return result
+# Types that can be used in the "fields" of a json parser in agents.json
+FIELD_TYPES = {"bool": bool, "str": str, "int": int, "float": float}
+JSON_SCHEMA_TYPES = {bool: "boolean", str: "string", int: "integer", float: "number"}
+FIELD_PATTERN = re.compile(r"\(\s*['\"](\w+)['\"]\s*,\s*(\w+)\s*\)")
+JSON_SNIPPET_PATTERN = re.compile(r"```json\s*(.*?)```", re.DOTALL)
+
+
+def parse_fields(fields: str) -> dict:
+    """Turns the "fields" of a json parser, e.g. "[('accepted', bool), ('text', str)]", into a dict of name and type"""
+    return {
+        name: FIELD_TYPES[type_name]
+        for name, type_name in FIELD_PATTERN.findall(fields)
+    }
+
+
+def json_schema(fields: str) -> dict:
+    """Returns the JSON schema of the object described by the "fields" of a json parser"""
+    properties = {
+        name: {"type": JSON_SCHEMA_TYPES[field_type]}
+        for name, field_type in parse_fields(fields).items()
+    }
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+def repair_json(string_dict: str) -> str:
+    """
+    Fixes the mistakes that LLMs typically make when writing JSON: comments copied from the schema, trailing
+    commas, Python literals and unescaped quotes within strings.
+    """
+    repaired = []
+    in_string = False
+    i = 0
+    while i < len(string_dict):
+        char = string_dict[i]
+        if in_string:
+            if char == "\\":
+                repaired.append(string_dict[i : i + 2])
+                i += 2
+                continue
+            if char == '"':
+                # A quote only ends the string if it is followed by a delimiter, otherwise it belongs to the text
+                following = string_dict[i + 1 :].lstrip()[:1]
+                if following in ("", ",", "}", "]", ":"):
+                    in_string = False
+                    repaired.append(char)
+                else:
+                    repaired.append('\\"')
+                i += 1
+                continue
+            repaired.append(char)
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif string_dict.startswith("//", i):
+            # Skip the comment until the end of the line
+            end = string_dict.find("\n", i)
+            i = len(string_dict) if end == -1 else end
+            continue
+        elif char == "," and string_dict[i + 1 :].lstrip()[:1] in ("}", "]"):
+            i += 1  # Skip the trailing comma
+            continue
+        else:
+            literal = next(
+                (
+                    literal
+                    for literal in ("True", "False", "None")
+                    if string_dict.startswith(literal, i)
+                ),
+                None,
+            )
+            if literal is not None:
+                repaired.append({"True": "true", "False": "false", "None": "null"}[literal])
+                i += len(literal)
+                continue
+
+        repaired.append(char)
+        i += 1
+
+    return "".join(repaired)
+
+
+def validate_fields(result: dict, fields: dict) -> dict:
+    """Checks that all fields are present and coerces their types. Returns the fields in the order of the schema"""
+    validated = {}
+    for name, field_type in fields.items():
+        if name not in result:
+            raise ParseError(f'The field "{name}" is missing')
+
+        value = result[name]
+        if field_type is bool and isinstance(value, str):
+            if value.strip().lower() not in ("true", "false"):
+                raise ParseError(f'The field "{name}" has to be true or false')
+            value = value.strip().lower() == "true"
+        elif field_type is str and not isinstance(value, str):
+            value = json.dumps(value) if isinstance(value, (dict, list)) else str(value)
+        elif field_type in (int, float) and not isinstance(value, (int, float)):
+            try:
+                value = field_type(value)
+            except (TypeError, ValueError):
+                raise ParseError(f'The field "{name}" has to be a number')
+        elif not isinstance(value, field_type):
+            raise ParseError(f'The field "{name}" has the wrong type')
+
+        validated[name] = value
+
+    return validated
+
+
+def parse_json(message: str, fields: Optional[dict] = None) -> dict:
+    """
+    Extracts a JSON object from an answer. The object may be in a markdown code snippet (the prompts ask for it) or
+    raw (JSON mode). Malformed JSON is repaired locally.
+
+    Args:
+        message (str): The answer of the agent.
+        fields (Optional[dict]): The fields as returned by parse_fields. If given, the object is validated against them.
+
+    Returns:
+        dict: The parsed object.
+    """
+    regex_obj = JSON_SNIPPET_PATTERN.search(message)
+    if regex_obj is not None:
+        string_dict = regex_obj.group(1).strip()
+    else:
+        start, end = message.find("{"), message.rfind("}")
+        if start == -1 or end < start:
+            raise ParseError("The answer does not contain a JSON object")
+        string_dict = message[start : end + 1]
+
+    try:
+        result = json.loads(string_dict, strict=False)
+    except json.JSONDecodeError:
+        try:
+            result = json.loads(repair_json(string_dict), strict=False)
+        except json.JSONDecodeError as e:
+            raise ParseError(f"The JSON object is malformed: {e}")
+
+    if not isinstance(result, dict):
+        raise ParseError("The answer is not a JSON object")
+
+    return validate_fields(result, fields) if fields else result
+
+
+class SnippetScanner:
+    """
+    Finds the first complete code snippet in a streamed answer. Every chunk is only scanned once, so feeding a
+    whole answer chunk by chunk costs about as much as a single search.
+    """
+
+    def __init__(self, opening_fence: str) -> None:
+        self.opening_fence = opening_fence
+        self.text = ""
+        self.__scan_from = 0
+        self.__content_start: Optional[int] = None  # Index after the opening fence once it was found
+
+    def feed(self, chunk: str) -> Optional[int]:
+        """
+        Appends a chunk of the answer.
+
+        Args:
+            chunk (str): The next streamed chunk.
+
+        Returns:
+            Optional[int]: The index after the closing fence of the first snippet or None if it is not complete yet.
+        """
+        self.text += chunk
+
+        if self.__content_start is None:
+            start = self.text.find(self.opening_fence, self.__scan_from)
+            if start == -1:
+                # The fence might be split between this chunk and the next one
+                self.__scan_from = max(0, len(self.text) - len(self.opening_fence) + 1)
+                return None
+            self.__content_start = self.__scan_from = start + len(self.opening_fence)
+
+        end = self.text.find("```", self.__scan_from)
+        if end == -1:
+            self.__scan_from = max(self.__content_start, len(self.text) - 2)
+            return None
+        return end + 3
+
+
+class MessageParser:
+    """
+    Parses the answers of an agent. Built once per agent from the "parser" entry of agents.json, so that the
+    patterns and fields are only compiled once.
+    """
+
+    def __init__(self, config: Optional[dict]) -> None:
+        """
+        Args:
+            config (Optional[dict]): The "parser" entry of agents.json. None or "use_parser": false return answers as they are.
+        """
+        self.config = config
+        self.enabled: bool = bool(config) and config["use_parser"] != False
+        self.type: Optional[str] = config["type"] if self.enabled else None
+
+        self.fields: dict = {}
+        if self.type == "code":
+            self.language: str = config["fields"][0]
+            self.opening_fence = f"```{self.language}"
+            self.pattern = re.compile(f"{re.escape(self.opening_fence)}(.*?)```", re.DOTALL)
+        elif self.type == "json":
+            self.opening_fence = "```json"
+            self.pattern = JSON_SNIPPET_PATTERN
+            self.fields = parse_fields(config["fields"]) if config.get("fields") else {}
+
+    def parse(self, message: str):
+        """Returns the code of a code parser, the validated object of a json parser or the message itself"""
+        if not self.enabled:
+            return message
+
+        if self.type == "json":
+            return parse_json(message, self.fields)
+
+        regex_obj = self.pattern.search(message)
+        if regex_obj is None:
+            raise ParseError(
+                f'The answer does not contain a markdown code snippet starting with "{self.opening_fence}"'
+            )
+
+        return regex_obj.group(1).strip()
+
+    def scanner(self) -> Optional[SnippetScanner]:
+        """Returns a new incremental scanner for a streamed answer or None if the answer is not parsed"""
+        return SnippetScanner(self.opening_fence) if self.enabled else None
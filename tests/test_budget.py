@@ -0,0 +1,22 @@
+import json
+
+from src.budget import learn_turn_budget
+
+
+def write_runs(directory, name, turns):
+    with open(directory / name, "w") as file:
+        json.dump([{"turns_backend": count} for count in turns], file)
+
+
+def test_no_history_uses_the_limit(tmp_path):
+    assert learn_turn_budget(tmp_path, "backend") == 7
+
+
+def test_budget_covers_the_quantile_plus_slack(tmp_path):
+    write_runs(tmp_path, "quick.json", [1, 1, 2, 2, 2, 2, 2, 2, 2, 3])
+    assert learn_turn_budget(tmp_path, "backend") == 3
+
+
+def test_runs_that_hit_the_limit_are_not_dropped(tmp_path):
+    write_runs(tmp_path, "capped.json", [2, 2, 2, 2, 2, 7, 7, 9, 10, 0])
+    assert learn_turn_budget(tmp_path, "backend") == 7
@@ -0,0 +1,47 @@
+import itertools
+
+import pytest
+
+from src import cache as cache_module
+from src.cache import DiskCache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # Every operation gets a later access time, so that the eviction order does not depend on the clock resolution
+    clock = itertools.count()
+    monkeypatch.setattr(cache_module.time, "time", lambda: next(clock))
+    return DiskCache(tmp_path / "cache.sqlite", max_entries=2)
+
+
+def test_hits_and_misses_are_counted(cache):
+    assert cache.get("a") is None
+    cache.set("a", {"answer": "text", "usage": [1, 2]})
+    assert cache.get("a") == {"answer": "text", "usage": [1, 2]}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")  # "b" is now the least recently used entry
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_entries_persist_between_instances(cache):
+    cache.set("a", "value")
+    assert DiskCache(cache.path).get("a") == "value"
+
+
+def test_key_is_stable():
+    key = DiskCache.make_key("gpt-4", [{"role": "user", "content": "Hi"}], {"temperature": 0, "seed": 1})
+    assert key == DiskCache.make_key("gpt-4", [{"role": "user", "content": "Hi"}], {"seed": 1, "temperature": 0})
+    assert len(key) == 64
+
+
+def test_key_depends_on_every_part():
+    key = DiskCache.make_key("gpt-4", "prompt", {"temperature": 0})
+    assert key != DiskCache.make_key("gpt-4", "prompt", {"temperature": 0.2})
+    assert key != DiskCache.make_key("gpt-4", "prompt", {"temperature": 0}, "http://localhost:8000")
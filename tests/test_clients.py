@@ -0,0 +1,28 @@
+import asyncio
+
+from src.clients import aclose_http_clients, get_async_http_client, get_http_client
+
+
+def test_clients_are_shared_until_closed():
+    async def run():
+        http_client, async_http_client = get_http_client(), get_async_http_client()
+        assert get_http_client() is http_client
+        assert get_async_http_client() is async_http_client
+
+        await aclose_http_clients()
+        assert http_client.is_closed and async_http_client.is_closed
+        # The next request gets new clients
+        assert get_http_client() is not http_client
+        assert get_async_http_client() is not async_http_client
+        await aclose_http_clients()
+
+    asyncio.run(run())
+
+
+def test_every_event_loop_has_its_own_client():
+    async def client():
+        async_http_client = get_async_http_client()
+        await aclose_http_clients()
+        return async_http_client
+
+    assert asyncio.run(client()) is not asyncio.run(client())
@@ -0,0 +1,22 @@
+from src.utils import code_hash
+
+
+def test_python_indentation_is_significant():
+    code = "if x:\n    y = 1\nz = 2"
+    assert code_hash(code, "backend") != code_hash("if x:\n    y = 1\n    z = 2", "backend")
+
+
+def test_other_layers_ignore_indentation():
+    html = "<ul>\n  <li>One</li>\n</ul>"
+    assert code_hash(html, "frontend") == code_hash("<ul>\n<li>One</li>\n</ul>", "frontend")
+    sql = "CREATE TABLE t (\n    id INT\n);"
+    assert code_hash(sql, "database") == code_hash("CREATE TABLE t (\nid INT\n);", "database")
+
+
+def test_blank_lines_and_trailing_whitespace_are_ignored():
+    code = "import os\n\ndef main():\n    pass"
+    assert code_hash(code, "backend") == code_hash("\nimport os   \n\n\n\ndef main():\n    pass\n\n", "backend")
+
+
+def test_changed_code_has_another_hash():
+    assert code_hash("SELECT 1;", "database") != code_hash("SELECT 2;", "database")
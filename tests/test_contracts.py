@@ -0,0 +1,93 @@
+import json
+
+from src.contracts import compact_openapi, database_contract, describe_contracts
+
+
+def test_database_contract():
+    code = """
+    -- The users of the app
+    CREATE TABLE IF NOT EXISTS "users" (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR(100) NOT NULL, /* the display name */
+        price NUMERIC(10, 2) CHECK (price > 0),
+        CONSTRAINT unique_name UNIQUE (name)
+    );
+    INSERT INTO users (name, price) VALUES ('a, b', 1);
+    """
+    assert json.loads(database_contract(code)) == {
+        "users": {
+            "id": "SERIAL PRIMARY KEY",
+            "name": "VARCHAR(100) NOT NULL",
+            "price": "NUMERIC(10, 2) CHECK (price > 0)",
+            "constraints": ["CONSTRAINT unique_name UNIQUE (name)"],
+        }
+    }
+
+
+def test_database_contract_without_tables():
+    assert database_contract("INSERT INTO users VALUES (1); -- CREATE TABLE x (id INT)") is None
+
+
+def test_compact_openapi():
+    openapi = {
+        "paths": {
+            "/users/{user_id}": {
+                "get": {
+                    "parameters": [
+                        {"name": "user_id", "required": True, "schema": {"type": "integer"}},
+                        {"name": "verbose", "schema": {"type": "boolean"}},
+                    ],
+                    "responses": {
+                        "200": {"content": {"application/json": {"schema": {"$ref": "#/components/schemas/User"}}}}
+                    },
+                }
+            },
+            "/users": {
+                "post": {
+                    "requestBody": {
+                        "content": {"application/json": {"schema": {"$ref": "#/components/schemas/User"}}}
+                    },
+                    "responses": {"201": {"description": "Created"}},
+                }
+            },
+        },
+        "components": {
+            "schemas": {
+                "User": {
+                    "properties": {
+                        "name": {"type": "string"},
+                        "tags": {"type": "array", "items": {"type": "string"}},
+                        "email": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+                    },
+                    "required": ["name"],
+                }
+            }
+        },
+    }
+    user = {"name": "string", "tags?": ["string"], "email?": "string"}
+    assert json.loads(compact_openapi(openapi)) == {
+        "GET /users/{user_id}": {"params": {"user_id": "integer", "verbose?": "boolean"}, "returns": user},
+        "POST /users": {"body": user},
+    }
+
+
+def test_describe_contracts_falls_back_to_documentation():
+    contracts = {"database": '{"users":{"id":"INT"}}', "backend": None}
+    docs = {"database": "The users table", "backend": "A FastAPI server"}
+    assert describe_contracts(contracts, docs) == (
+        'Here are the tables of the database as JSON: {"users":{"id":"INT"}}\n'
+        "Here is the documentation for the backend: A FastAPI server\n"
+    )
+
+
+def test_backend_description_contains_the_base_url():
+    openapi = {"paths": {"/items": {"get": {"responses": {"200": {}}}}}}
+    contracts = {"backend": compact_openapi(openapi, base_url="http://localhost:8000")}
+    description = describe_contracts(contracts, {"backend": "A FastAPI server"})
+    assert "http://localhost:8000" in description
+    assert "GET /items" in description
+
+
+def test_base_url_defaults_to_the_servers_entry():
+    openapi = {"servers": [{"url": "http://localhost:8001"}], "paths": {}}
+    assert json.loads(compact_openapi(openapi)) == {"base_url": "http://localhost:8001"}
@@ -0,0 +1,90 @@
+import pytest
+
+from src.patch import PatchError, apply_patch, parse_hunks, unified_diff
+
+
+CODE = """import os
+
+def greet(name):
+    print("Hello", name)
+
+def main():
+    greet("world")
+"""
+
+
+def test_apply_patch():
+    diff = """--- a/index.py
++++ b/index.py
+@@ -3,2 +3,2 @@
+ def greet(name):
+-    print("Hello", name)
++    print("Hi", name)
+"""
+    assert apply_patch(CODE, diff) == CODE.replace('"Hello"', '"Hi"')
+
+
+def test_wrong_line_numbers_are_only_a_hint():
+    diff = "@@ -40,2 +40,2 @@\n def main():\n-    greet(\"world\")\n+    greet(\"you\")"
+    assert apply_patch(CODE, diff).endswith('    greet("you")\n')
+
+
+def test_header_without_line_numbers():
+    diff = "@@ @@\n-import os\n+import sys"
+    assert apply_patch(CODE, diff).startswith("import sys\n")
+
+
+def test_trailing_whitespace_and_missing_context_space_are_tolerated():
+    code = CODE.replace("def main():", "def main():   ")
+    diff = "@@ -5,3 +5,3 @@\n\n def main():\n-    greet(\"world\")\n+    greet(\"there\")"
+    assert 'greet("there")' in apply_patch(code, diff)
+
+
+def test_several_hunks_shift_the_following_line_numbers():
+    diff = (
+        "@@ -1,1 +1,2 @@\n import os\n+import sys\n"
+        "@@ -6,2 +7,2 @@\n def main():\n-    greet(\"world\")\n+    greet(sys.argv[1])"
+    )
+    patched = apply_patch(CODE, diff).splitlines()
+    assert patched[:2] == ["import os", "import sys"]
+    assert patched[-1] == "    greet(sys.argv[1])"
+
+
+def test_the_closest_match_to_the_hint_is_replaced():
+    code = "x = 1\ny = 2\nx = 1\n"
+    assert apply_patch(code, "@@ -3,1 +3,1 @@\n-x = 1\n+x = 3") == "x = 1\ny = 2\nx = 3\n"
+
+
+def test_pure_insertion_uses_the_line_number():
+    assert apply_patch("a\nb\n", "@@ -1,0 +2,1 @@\n+inserted") == "a\ninserted\nb\n"
+
+
+@pytest.mark.parametrize(
+    "diff, message",
+    [
+        ("@@ -3,1 +3,1 @@\n-print('not in the code')\n+print(1)", "were not found"),
+        ("@@ @@\n+only added", "no line numbers"),
+        ("just some text", "outside of a hunk"),
+        ("--- a/index.py\n+++ b/index.py", "does not contain any hunk"),
+    ],
+)
+def test_failing_hunks(diff, message):
+    with pytest.raises(PatchError, match=message):
+        apply_patch(CODE, diff)
+
+
+def test_hunks_are_applied_in_order():
+    # The second hunk refers to lines before the first one
+    diff = "@@ -6,1 +6,1 @@\n-def main():\n+def run():\n@@ -1,1 +1,1 @@\n-import os\n+import sys"
+    with pytest.raises(PatchError):
+        apply_patch(CODE, diff)
+
+
+def test_parse_hunks_ignores_no_newline_marker():
+    hunks = parse_hunks("@@ -1 +1 @@\n-a\n+b\n\\ No newline at end of file")
+    assert hunks == [{"start": 1, "old": ["a"], "new": ["b"]}]
+
+
+def test_unified_diff_round_trip():
+    new_code = CODE.replace("import os", "import os\nimport sys").replace('"world"', '"you"')
+    assert apply_patch(CODE, unified_diff(CODE, new_code, context=1)) == new_code
@@ -0,0 +1,78 @@
+import pytest
+
+from src.prechecks import check_backend, check_database, check_frontend, run_precheck
+
+
+VALID_SQL = [
+    "START TRANSACTION;\nCREATE TABLE users (id SERIAL PRIMARY KEY);\nCOMMIT;",
+    "INSERT INTO quotes (text) VALUES (E'It\\'s a quote');",
+    "INSERT INTO quotes (text) VALUES ('It''s a quote');",
+    "INSERT INTO paths (path) VALUES (E'C:\\\\temp\\\\');",
+    "CREATE FUNCTION one() RETURNS int AS $$ SELECT 1; $$ LANGUAGE sql;",
+    "CREATE TABLE \"order\" (id INT); -- a comment with a ' quote\n/* another ( comment */",
+    "BEGIN; SAVEPOINT a; RELEASE SAVEPOINT a; END;",
+]
+
+VALID_PYTHON = [
+    "from typing_extensions import Annotated\nfrom fastapi import FastAPI\napp = FastAPI()",
+    "import asyncio, json, zoneinfo\nfrom starlette.responses import JSONResponse",
+    "try:\n    import orjson\nexcept ImportError:\n    orjson = None",
+]
+
+
+@pytest.mark.parametrize("code", VALID_SQL)
+def test_valid_sql_passes(code):
+    errors, _ = check_database(code)
+    assert errors == []
+
+
+@pytest.mark.parametrize("code", VALID_PYTHON)
+def test_valid_python_passes(code):
+    assert check_backend(code) == ([], [])
+
+
+def test_unknown_sql_keyword_is_only_a_warning():
+    message, warnings = run_precheck("database", "REPLACE INTO users VALUES (1);")
+    assert message is None
+    assert "REPLACE" in warnings
+
+
+def test_unknown_import_is_only_a_warning():
+    errors, warnings = check_backend("import requests")
+    assert errors == []
+    assert "requests" in warnings[0]
+
+
+def test_modules_of_newer_pythons_are_not_stdlib():
+    # The sandbox runs Python 3.9, which has no tomllib
+    assert check_backend("import tomllib")[1]
+
+
+@pytest.mark.parametrize(
+    "code",
+    [
+        "INSERT INTO quotes (text) VALUES ('It\\'s a quote');",
+        "CREATE TABLE users (id INT;",
+        "SELECT 1);",
+        "/* never closed",
+    ],
+)
+def test_invalid_sql_is_rejected(code):
+    message, _ = run_precheck("database", code)
+    assert message is not None
+
+
+def test_python_syntax_error_is_rejected():
+    message, _ = run_precheck("backend", "def broken(:\n    pass")
+    assert "SyntaxError in line 1" in message
+
+
+def test_valid_html_passes():
+    code = "<!DOCTYPE html><html><body><ul><li>One<li>Two</ul><br><img src='a.png'></body></html>"
+    assert check_frontend(code) == ([], [])
+
+
+def test_unclosed_html_element_is_only_a_warning():
+    message, warnings = run_precheck("frontend", "<div><span>text</div>")
+    assert message is None
+    assert "<span>" in warnings
@@ -0,0 +1,91 @@
+import json
+
+import pytest
+
+from src import ratelimit
+from src.ratelimit import RateLimiter, get_rate_limiter, load_rate_limits
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ratelimit.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_full_bucket_does_not_wait(clock):
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+    limiter.acquire(400)
+    limiter.acquire(400)
+    assert clock.sleeps == []
+
+
+def test_empty_request_bucket_refills(clock):
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000)
+    limiter.acquire(10)
+    limiter.acquire(10)
+    limiter.acquire(10)
+    # One request is refilled after half a minute
+    assert clock.sleeps == [pytest.approx(30)]
+
+
+def test_missing_tokens_decide_the_wait(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=1000)
+    limiter.acquire(900)
+    limiter.acquire(400)
+    assert sum(clock.sleeps) == pytest.approx(18)  # 300 missing tokens at 1000 per minute
+
+
+def test_call_larger_than_the_bucket_does_not_wait_forever(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=1000)
+    limiter.acquire(5000)
+    assert clock.sleeps == []
+
+
+def test_settle_refunds_overestimated_tokens(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=1000)
+    limiter.acquire(900)
+    limiter.settle(estimated_tokens=900, actual_tokens=100)
+    limiter.acquire(800)
+    assert clock.sleeps == []
+
+
+def test_settle_charges_underestimated_tokens(clock):
+    limiter = RateLimiter(requests_per_minute=100, tokens_per_minute=1000)
+    limiter.acquire(100)
+    limiter.settle(estimated_tokens=100, actual_tokens=900)
+    limiter.acquire(200)
+    assert sum(clock.sleeps) == pytest.approx(6)  # 100 missing tokens
+
+
+def test_limiter_is_shared_per_model():
+    config = {"requests_per_minute": 10, "tokens_per_minute": 100}
+    assert get_rate_limiter("test-shared", config) is get_rate_limiter("test-shared", dict(config))
+    assert get_rate_limiter("test-shared", None) is None
+
+
+def test_conflicting_limits_raise():
+    get_rate_limiter("test-conflict", {"requests_per_minute": 10, "tokens_per_minute": 100})
+    with pytest.raises(ValueError, match="Conflicting rate limits for test-conflict"):
+        get_rate_limiter("test-conflict", {"requests_per_minute": 20, "tokens_per_minute": 100})
+
+
+def test_load_rate_limits(tmp_path):
+    path = tmp_path / "rate_limits.json"
+    path.write_text(json.dumps({"model": {"requests_per_minute": 1, "tokens_per_minute": 2}}))
+    assert load_rate_limits(path)["model"]["tokens_per_minute"] == 2
+    assert load_rate_limits(tmp_path / "missing.json") == {}
@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+from src.utils import ParseError, parse_fields, parse_json, repair_json
+
+
+VERDICT_FIELDS = parse_fields("[('accepted', bool), ('text', str)]")
+
+
+@pytest.mark.parametrize(
+    "broken, expected",
+    [
+        ('{"accepted": true, "text": "ok",}', {"accepted": True, "text": "ok"}),
+        ('{"items": [1, 2, 3,]}', {"items": [1, 2, 3]}),
+        (
+            '{"accepted": false, // Write False if there are errors\n "text": "fix"}',
+            {"accepted": False, "text": "fix"},
+        ),
+        ('{"accepted": True, "value": None}', {"accepted": True, "value": None}),
+        (
+            '{"text": "Rename the "users" table", "accepted": false}',
+            {"text": 'Rename the "users" table', "accepted": False},
+        ),
+        ('{"text": "Use a \\"quoted\\" name"}', {"text": 'Use a "quoted" name'}),
+    ],
+)
+def test_repair(broken, expected):
+    assert json.loads(repair_json(broken)) == expected
+
+
+def test_literals_and_comments_inside_strings_are_kept():
+    text = '{"text": "True, None and // are fine here",}'
+    assert json.loads(repair_json(text)) == {"text": "True, None and // are fine here"}
+
+
+def test_valid_json_is_unchanged():
+    text = '{"accepted": true, "text": "a, b: c", "list": [1, {"x": null}]}'
+    assert repair_json(text) == text
+
+
+def test_parse_json_finds_snippet_and_validates_fields():
+    answer = 'Here is my verdict:\n```json\n{"text": "ok", "accepted": "True",}\n```'
+    assert parse_json(answer, VERDICT_FIELDS) == {"accepted": True, "text": "ok"}
+
+
+def test_parse_json_accepts_raw_objects_of_json_mode():
+    assert parse_json('{"accepted": false, "text": "x"}') == {"accepted": False, "text": "x"}
+
+
+@pytest.mark.parametrize(
+    "answer",
+    [
+        "No JSON at all",
+        '```json\n{"accepted": true}\n```',  # "text" is missing
+        '```json\n{"accepted": "maybe", "text": "x"}\n```',
+        '```json\n{"accepted": true, "text": \n```',
+    ],
+)
+def test_parse_json_rejects(answer):
+    with pytest.raises(ParseError):
+        parse_json(answer, VERDICT_FIELDS)
@@ -0,0 +1,40 @@
+import pytest
+
+from src.retry import LatencyTracker, backoff_delay, hedge_delay
+
+
+@pytest.mark.parametrize("attempt, cap", [(0, 1.0), (1, 2.0), (3, 8.0), (10, 30.0)])
+def test_backoff_delay_is_capped(attempt, cap):
+    delays = [backoff_delay(attempt, base_delay=1.0, max_delay=30.0) for _ in range(200)]
+    assert all(0 <= delay <= cap for delay in delays)
+    # Full jitter spreads the retries of concurrent calls
+    assert max(delays) > cap / 2
+
+
+def test_percentile_needs_min_samples():
+    tracker = LatencyTracker(min_samples=10)
+    for latency in range(9):
+        tracker.add(latency)
+    assert tracker.percentile(0.95) is None
+    tracker.add(9)
+    assert tracker.percentile(0.95) == 9
+
+
+def test_p95_of_the_window():
+    tracker = LatencyTracker(window=100)
+    for latency in range(1, 201):  # Only the latest 100 latencies (101 to 200) are kept
+        tracker.add(float(latency))
+    assert tracker.percentile(0.95) == 196.0
+    assert tracker.percentile(0.5) == 151.0
+
+
+def test_hedge_delay():
+    tracker = LatencyTracker()
+    assert hedge_delay(None, tracker) is None
+    assert hedge_delay(2, tracker) == 2.0
+    assert hedge_delay("p95", tracker) is None  # Not enough samples yet
+
+    for latency in range(1, 21):
+        tracker.add(float(latency))
+    assert hedge_delay("p95", tracker) == 20.0
+    assert hedge_delay("p50", tracker) == 11.0
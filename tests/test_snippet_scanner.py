@@ -0,0 +1,48 @@
+import pytest
+
+from src.utils import MessageParser, ParseError, SnippetScanner
+
+
+def feed_all(scanner: SnippetScanner, chunks: list) -> list:
+    return [scanner.feed(chunk) for chunk in chunks]
+
+
+def test_snippet_in_one_chunk():
+    text = "Sure:\n```python\nprint(1)\n```\nDone"
+    end = SnippetScanner("```python").feed(text)
+    assert text[:end] == "Sure:\n```python\nprint(1)\n```"
+
+
+@pytest.mark.parametrize("split", range(1, len("Code: ```python\nx = 1\n``` after")))
+def test_fence_split_at_any_position(split):
+    text = "Code: ```python\nx = 1\n``` after"
+    scanner = SnippetScanner("```python")
+    results = feed_all(scanner, [text[:split], text[split:]])
+    assert text[: results[-1]] == "Code: ```python\nx = 1\n```"
+    # The stream only ends once the closing fence is complete
+    assert results[0] is None or split >= len("Code: ```python\nx = 1\n```")
+
+
+def test_closing_fence_in_a_later_chunk():
+    scanner = SnippetScanner("```sql")
+    assert feed_all(scanner, ["```sql\n", "SELECT 1;\n", "`", "`", "`", "\nmore"]) == [None, None, None, None, 20, 20]
+
+
+def test_other_fences_are_skipped():
+    scanner = SnippetScanner("```html")
+    assert scanner.feed("```css\nbody {}\n```\n") is None
+    end = scanner.feed("```html\n<p></p>\n```")
+    assert scanner.text[:end].endswith("```html\n<p></p>\n```")
+
+
+def test_parser_is_compiled_once_and_parses():
+    parser = MessageParser({"type": "code", "use_parser": True, "fields": ["python"]})
+    assert parser.opening_fence == "```python"
+    assert parser.parse("a\n```python\nprint(1)\n```\nb") == "print(1)"
+    with pytest.raises(ParseError):
+        parser.parse("no code")
+
+
+def test_disabled_parser_returns_the_message():
+    parser = MessageParser({"type": "code", "use_parser": False, "fields": ["python"]})
+    assert parser.parse("no code") == "no code"
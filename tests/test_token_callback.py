@@ -0,0 +1,61 @@
+import pytest
+
+from src.agents import SnippetComplete, TokenCallbackHandler
+from src.patch import DIFF_PARSER
+from src.utils import MessageParser
+
+
+PYTHON_PARSER = MessageParser({"type": "code", "use_parser": True, "fields": ["python"]})
+
+
+def stream(handler: TokenCallbackHandler, tokens: list) -> str:
+    """Feeds the tokens until the handler ends the stream. Returns the text that ended it"""
+    for token in tokens:
+        try:
+            handler.on_llm_new_token(token)
+        except SnippetComplete as e:
+            return e.text
+    return None
+
+
+def test_stream_ends_after_the_snippet():
+    received = []
+    handler = TokenCallbackHandler(received.append, PYTHON_PARSER.scanner())
+    text = stream(handler, ["Here:\n```py", "thon\nprint(1)\n``", "`\nThis prints 1.", " More text"])
+    assert text == "Here:\n```python\nprint(1)\n```"
+    assert "".join(received) == text  # Nothing after the snippet reaches the chat
+
+
+def test_diff_answer_ends_after_the_diff_not_after_another_snippet():
+    answer = [
+        "The old code was:\n```python\nprint(1)\n```\n",
+        "The diff:\n```diff\n@@ -1 +1 @@\n-print(1)\n+print(2)\n```",
+        "\nDone.",
+    ]
+    assert stream(TokenCallbackHandler(None, PYTHON_PARSER.scanner()), answer) == answer[0].rstrip("\n")
+    assert stream(TokenCallbackHandler(None, DIFF_PARSER.scanner()), answer) == "".join(answer[:2])
+
+
+def test_json_parser_waits_for_the_json_snippet():
+    parser = MessageParser({"type": "json", "use_parser": True, "fields": "[('accepted', bool)]"})
+    answer = ["```python\nx = 1\n```\n", '```json\n{"accepted": true}\n```', " Bye"]
+    assert stream(TokenCallbackHandler(None, parser.scanner()), answer) == "".join(answer[:2])
+
+
+def test_without_scanner_every_token_is_passed_on():
+    received = []
+    handler = TokenCallbackHandler(received.append)
+    assert stream(handler, ["```python\n", "x\n```", " after"]) is None
+    assert received == ["```python\n", "x\n```", " after"]
+    assert not handler.raise_error
+
+
+def test_unparsed_answers_have_no_scanner():
+    assert MessageParser({"type": "code", "use_parser": False, "fields": ["python"]}).scanner() is None
+    assert MessageParser(None).scanner() is None
+
+
+@pytest.mark.parametrize("parser", [PYTHON_PARSER, DIFF_PARSER])
+def test_incomplete_snippet_does_not_end_the_stream(parser):
+    handler = TokenCallbackHandler(None, parser.scanner())
+    assert stream(handler, [f"{parser.opening_fence}\nline\n", "`` no closing fence"]) is None